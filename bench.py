@@ -0,0 +1,337 @@
+"""In-process load test for the giveaway hot paths (entering, ending, rerolling).
+
+Runs bot.py against fake Discord objects in a temporary data directory and
+prints one JSON document with throughput, latency percentiles, bytes written
+and peak memory per scenario, e.g.
+
+    python bench.py --backend sqlite --entrants 100000 --giveaways 1000 --winners 200
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Fake Discord objects - just enough surface for the handlers in bot.py
+class FakeRest:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.mention = f"<@&{role_id}>"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class FakeMember:
+    def __init__(self, user_id, guild, roles, rest):
+        self.id = user_id
+        self.guild = guild
+        self.roles = list(roles)
+        self.rest = rest
+        self.mention = f"<@{user_id}>"
+        self.name = self.display_name = f"user{user_id}"
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def add_roles(self, *roles, **kwargs):
+        await self.rest.call()
+        self.roles.extend(roles)
+
+    async def send(self, *args, **kwargs):
+        await self.rest.call()
+
+class FakeGuild:
+    def __init__(self, guild_id, roles):
+        self.id = guild_id
+        self.roles = roles
+        self.members = {}
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_member_named(self, name):
+        return next((member for member in self.members.values() if member.name == name), None)
+
+class FakeMessage:
+    def __init__(self, message_id, channel, embed, rest):
+        self.id = message_id
+        self.channel = channel
+        self.embeds = [embed] if embed else []
+        self.rest = rest
+
+    async def edit(self, embed=None, **kwargs):
+        await self.rest.call()
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+message_ids = itertools.count(10**17)
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, rest):
+        self.id = channel_id
+        self.guild = guild
+        self.rest = rest
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, embeds=None, view=None, **kwargs):
+        await self.rest.call()
+        message = FakeMessage(next(message_ids), self, embed, self.rest)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        await self.rest.call()
+        return self.messages[message_id]
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+
+    async def defer(self, *args, **kwargs):
+        self.done = True
+
+    async def edit_message(self, *args, **kwargs):
+        self.done = True
+
+    async def send_modal(self, *args, **kwargs):
+        self.done = True
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        pass
+
+class FakeInteraction:
+    def __init__(self, user, guild, channel, message=None):
+        self.user = user
+        self.guild = guild
+        self.channel = channel
+        self.message = message
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+# Measurement helpers
+def bytes_written():
+    """Bytes this process has passed to write() so far (Linux only)"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class Scenario:
+    def __init__(self, name, trace_memory, settle):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.settle = settle  # coroutine function finishing the work the scenario deferred
+        self.latencies = []
+
+    async def __aenter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.written = bytes_written()
+        self.started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+        # Deferred writes (e.g. the JSON write-behind flush) count towards the bytes, not the time
+        await self.settle()
+        written = bytes_written()
+        self.bytes_written = written - self.written if written is not None else None
+        self.peak_memory_kb = None
+        if self.trace_memory:
+            self.peak_memory_kb = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+
+    async def time(self, coro):
+        started = time.perf_counter()
+        await coro
+        self.latencies.append(time.perf_counter() - started)
+
+    def report(self, **extra):
+        ops = len(self.latencies)
+        p50 = percentile(self.latencies, 0.50)
+        p99 = percentile(self.latencies, 0.99)
+        return {
+            'scenario': self.name,
+            'ops': ops,
+            'seconds': round(self.seconds, 4),
+            'throughput_per_s': round(ops / self.seconds, 1) if self.seconds else None,
+            'p50_ms': round(p50 * 1000, 4) if p50 is not None else None,
+            'p99_ms': round(p99 * 1000, 4) if p99 is not None else None,
+            'bytes_written': self.bytes_written,
+            'peak_memory_kb': self.peak_memory_kb,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            **extra
+        }
+
+# Finish deferred work - debounced entry counter edits, then the write-behind flush on the storage thread
+async def settle(bot, data):
+    while bot.entry_count_updater.tasks:
+        await asyncio.gather(*list(bot.entry_count_updater.tasks.values()), return_exceptions=True)
+    await data.storage.flush()
+
+async def run(args, bot):
+    rest = FakeRest(args.rest_latency_ms / 1000)
+    support_role = FakeRole(bot.SUPPORT_ROLE_ID)
+    booster_role = FakeRole(bot.BOOSTER_ROLE_ID)
+    winners_circle_role = FakeRole(bot.WINNERS_CIRCLE_ROLE_ID)
+    guild = FakeGuild(bot.PRIMARY_GUILD_ID, [support_role, booster_role, winners_circle_role])
+    data = bot.get_guild_data(guild.id)
+    settled = lambda: settle(bot, data)
+    log_channel = FakeChannel(bot.GIVEAWAY_LOG_CHANNEL_ID, guild, rest)
+    channels = {log_channel.id: log_channel}
+    bot.bot.get_channel = channels.get
+    bot.bot.get_guild = {guild.id: guild}.get
+
+    admin = FakeMember(1, guild, [support_role], rest)
+    guild.members[admin.id] = admin
+    for user_id in range(1000, 1000 + args.entrants):
+        roles = []
+        if user_id % 5 == 0:
+            roles.append(booster_role)
+        if user_id % 7 == 0:
+            roles.append(winners_circle_role)
+        guild.members[user_id] = FakeMember(user_id, guild, roles, rest)
+
+    # Post the giveaways
+    giveaways = []
+    end_time = datetime.utcnow() + timedelta(days=1)
+    for i in range(args.giveaways):
+        channel = FakeChannel(2000 + i, guild, rest)
+        channels[channel.id] = channel
+        giveaway_id = f"{channel.id}_{int(time.time())}"
+        message = await channel.send(embed=bot.discord.Embed().add_field(name="📊 Entries", value="0"))
+        await data.storage.save_giveaway(giveaway_id, {
+            'prize': f"Bench prize {i}",
+            'gp_amount': 1_000_000,
+            'gp_display': "1m GP",
+            'winners': args.winners,
+            'channel_id': channel.id,
+            'message_id': message.id,
+            'host_id': admin.id,
+            'end_time': end_time.isoformat(),
+            'required_role_id': None,
+            'ended': False
+        })
+        giveaways.append((giveaway_id, channel, message))
+
+    results = []
+
+    # Entering: one big giveaway, then clicks spread over every giveaway concurrently
+    big_id, big_channel, big_message = giveaways[0]
+    async with Scenario("enter_single_giveaway", args.trace_memory, settled) as scenario:
+        for user_id in range(1000, 1000 + args.entrants):
+            interaction = FakeInteraction(guild.members[user_id], guild, big_channel, big_message)
+            await scenario.time(bot.enter_giveaway(interaction, big_id))
+    results.append(scenario.report(entrants=args.entrants))
+
+    if len(giveaways) > 1:
+        async with Scenario("enter_concurrent_giveaways", args.trace_memory, settled) as scenario:
+            clicks = []
+            for n, user_id in enumerate(range(1000, 1000 + min(args.entrants, args.concurrent_clicks))):
+                giveaway_id, channel, message = giveaways[1 + n % (len(giveaways) - 1)]
+                interaction = FakeInteraction(guild.members[user_id], guild, channel, message)
+                clicks.append(scenario.time(bot.enter_giveaway(interaction, giveaway_id)))
+            for start in range(0, len(clicks), 500):
+                await asyncio.gather(*clicks[start:start + 500])
+        results.append(scenario.report(giveaways=len(giveaways) - 1))
+
+    # Ending the big giveaway
+    async with Scenario("end_giveaway", args.trace_memory, settled) as scenario:
+        calls_before = rest.calls
+        await scenario.time(bot.end_giveaway(data, big_id, await data.storage.get_giveaway(big_id)))
+    results.append(scenario.report(entrants=args.entrants, winners=args.winners, rest_calls=rest.calls - calls_before))
+
+    # Rerolling it
+    async with Scenario("giveaway_reroll", args.trace_memory, settled) as scenario:
+        for _ in range(args.rerolls):
+            interaction = FakeInteraction(admin, guild, big_channel)
+            await scenario.time(bot.giveaway_reroll.callback(interaction, str(big_message.id)))
+    results.append(scenario.report(entrants=args.entrants))
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the giveaway entry, end and reroll paths")
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--entrants", type=int, default=100_000)
+    parser.add_argument("--giveaways", type=int, default=1000, help="concurrent giveaways (the first one is the big one)")
+    parser.add_argument("--concurrent-clicks", type=int, default=20_000, help="clicks spread over the other giveaways")
+    parser.add_argument("--winners", type=int, default=200)
+    parser.add_argument("--rerolls", type=int, default=20)
+    parser.add_argument("--rest-latency-ms", type=float, default=0, help="simulated latency per Discord REST call")
+    parser.add_argument("--trace-memory", action="store_true", help="report tracemalloc peaks (slows the run)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # bot.py keeps its data files in the working directory
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = tempfile.mkdtemp(prefix="giveaway-bench-")
+    os.chdir(data_dir)
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["DATABASE_FILE"] = os.path.join(data_dir, "giveaways.db")
+    os.environ["PRIMARY_GUILD_ID"] = "1"
+    sys.path.insert(0, repo_dir)
+    import bot
+
+    started = datetime.utcnow()
+    results = asyncio.run(run(args, bot))
+    bot.storage_executor.shutdown(wait=True)
+    for data in bot.guild_data.values():
+        data.close()
+
+    report = {
+        'started_at': started.isoformat(),
+        'python': sys.version.split()[0],
+        'backend': args.backend,
+        'data_dir': data_dir,
+        'parameters': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(os.path.join(repo_dir, args.output) if not os.path.isabs(args.output) else args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
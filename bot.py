@@ -8,26 +8,264 @@ import asyncio
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import random
+import heapq
+from collections import OrderedDict
+import sqlite3
+import bisect
+import functools
+import time
+import gzip
+import zlib
+import aiohttp
+import sys
+import base64
+import socket
+import inspect
+import csv
+import hashlib
+import itertools
+import tempfile
+import shutil
+import argparse
+import io
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Metrics endpoint (Prometheus text format) - only collected when METRICS_PORT is set
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# In-process counters, gauges and latency histograms
+class Metrics:
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+        self.counters = {}    # name -> {labels: value}
+        self.gauges = {}      # name -> callable returning the current value
+        self.server = None
+
+    def observe(self, name, labels, value):
+        series = self.histograms.setdefault(name, {})
+        buckets = series.get(labels)
+        if buckets is None:
+            buckets = series[labels] = [0] * (len(self.BUCKETS) + 3)
+        buckets[bisect.bisect_left(self.BUCKETS, value)] += 1
+        buckets[-2] += value
+        buckets[-1] += 1
+
+    def inc(self, name, labels, amount=1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def gauge(self, name, read):
+        """read() returns the current value, or an awaitable of it"""
+        self.gauges[name] = read
+
+    async def render(self):
+        lines = []
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, buckets in series.items():
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {buckets[-2]}")
+                lines.append(f"{name}_count{format_labels(labels)} {buckets[-1]}")
+        for name, series in self.counters.items():
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        for name, read in self.gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            try:
+                value = read()
+                if inspect.isawaitable(value):
+                    value = await value
+                lines.append(f"{name} {value}")
+            except Exception as e:
+                print(f"Error reading metric {name}: {e}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if request_line.split(b" ")[1:2] == [b"/metrics"]:
+                status, body = "200 OK", (await self.render()).encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        if self.server is None:
+            self.server = await asyncio.start_server(self.serve, METRICS_HOST, METRICS_PORT)
+            print(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+metrics = Metrics() if METRICS_PORT else None
+
+# Time a function into a latency histogram - returns the function untouched when metrics are off
+def instrumented(name, metric="giveaway_handler_seconds", label="handler"):
+    def decorator(func):
+        if metrics is None:
+            return func
+        labels = ((label, name),)
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metrics.observe(metric, labels, time.perf_counter() - started)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    metrics.observe(metric, labels, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# Count bytes moved by the storage layer
+def count_io(direction, size):
+    if metrics:
+        metrics.inc("giveaway_storage_bytes_total", (('direction', direction),), size)
+
+# Count Discord REST calls and 429s per route via aiohttp tracing
+def rest_trace_config():
+    async def on_request_end(session, context, params):
+        path = re.sub(r'/\d{5,}', '/:id', params.url.path.split('/api/v10', 1)[-1])
+        labels = (('method', params.method), ('route', path))
+        metrics.inc("discord_rest_requests_total", labels)
+        if params.response.status == 429:
+            metrics.inc("discord_rest_ratelimited_total", labels)
+    
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Shards are sized automatically unless SHARD_COUNT is set
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+
+bot = commands.AutoShardedBot(
+    command_prefix="!",
+    intents=intents,
+    shard_count=SHARD_COUNT,
+    http_trace=rest_trace_config() if metrics else None
+)
 
 # Data files
 WALLET_FILE = "wallets.json"
 GIVEAWAY_FILE = "giveaways.json"
+GUILD_CONFIG_FILE = "guild_config.json"
+
+# Each guild's data lives in its own partition under DATA_DIR/<guild_id>/ - except PRIMARY_GUILD_ID,
+# which keeps the top-level files from single-server deployments
+PRIMARY_GUILD_ID = int(os.getenv("PRIMARY_GUILD_ID") or 0)
+DATA_DIR = os.getenv("DATA_DIR", "guilds")
+
+# Storage backend ("sqlite" or "json") and SQLite database file
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+DATABASE_FILE = os.getenv("DATABASE_FILE", "giveaways.db")
+
+# Wallet ledger (JSON backend files) and how many transactions between balance snapshots
+WALLET_LEDGER_FILE = "wallet_ledger.jsonl"
+WALLET_SNAPSHOT_FILE = "wallet_snapshot.json"
+WALLET_SNAPSHOT_EVERY = int(os.getenv("WALLET_SNAPSHOT_EVERY", "1000"))
+
+# Ended giveaways are moved to the compressed archive this many days after their end time
+ARCHIVE_FILE = "giveaways_archive.jsonl.gz"
+ARCHIVE_GRACE_DAYS = float(os.getenv("ARCHIVE_GRACE_DAYS", "7"))
+
+# Giveaway log embeds are batched into digest messages, sent at the latest this many seconds after they're queued;
+# ones the log channel can't take are kept in this per-guild file and retried, backing off to at most
+# LOG_RETRY_MAX_SECONDS apart, until delivered
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "5"))
+LOG_SPOOL_FILE = "log_spool.jsonl"
+LOG_RETRY_MAX_SECONDS = 600
+
+# Discord's limits per message - embeds, and characters across all of them
+LOG_EMBEDS_PER_MESSAGE = 10
+LOG_CHARS_PER_MESSAGE = 6000
+
+# /giveaway export - formats, the largest gzip part (also capped by the guild's upload limit) and rows per storage-thread slice
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_CHUNK_BYTES = int(float(os.getenv("EXPORT_CHUNK_MB", "8")) * 2**20)
+EXPORT_SLICE_ROWS = 5000
+
+# Hash of the last command tree synced to Discord - startup skips the (rate-limited) global sync while it matches
+COMMAND_TREE_HASH_FILE = "command_tree.sha256"
+
+# Longest time a change to the JSON files may sit in memory before being written
+FLUSH_INTERVAL_MS = int(os.getenv("FLUSH_INTERVAL_MS", "2000"))
+
+# Primary guild defaults - every guild can override these with /giveaway config
 SUPPORT_ROLE_ID = 1434628709452742747
 
 # Role IDs for extra entries
 BOOSTER_ROLE_ID = 591776624547201025
 WINNERS_CIRCLE_ROLE_ID = 1421659378523832431
 
+# Extra entries per role (primary guild) - override with ROLE_BONUSES="role_id:bonus,role_id:bonus"
+ROLE_BONUSES = {
+    int(role_id): int(bonus)
+    for role_id, bonus in (pair.split(":") for pair in os.getenv("ROLE_BONUSES", "").split(",") if pair.strip())
+} or {BOOSTER_ROLE_ID: 2, WINNERS_CIRCLE_ROLE_ID: 3}
+
+# Member prefetch ahead of a giveaway's end, and the missing-member count above which the whole guild is chunked
+PREFETCH_LEAD_MINUTES = float(os.getenv("PREFETCH_LEAD_MINUTES", "5"))
+PREFETCH_CHUNK_GUILD_THRESHOLD = 5000
+
+# Minimum seconds between edits of a giveaway's "📊 Entries" counter
+ENTRY_COUNT_UPDATE_INTERVAL = float(os.getenv("ENTRY_COUNT_UPDATE_INTERVAL", "5"))
+
+# Giveaway ending workers, the lease each holds on a claimed giveaway, and how often idle workers poll for due ones
+END_WORKERS = int(os.getenv("END_WORKERS", "4"))
+END_LEASE_SECONDS = float(os.getenv("END_LEASE_SECONDS", "120"))
+END_POLL_SECONDS = float(os.getenv("END_POLL_SECONDS", "30"))
+
+# Failed endings are retried from their last finished stage with exponential back-off, then abandoned
+END_MAX_ATTEMPTS = int(os.getenv("END_MAX_ATTEMPTS", "5"))
+END_RETRY_BASE_SECONDS = 60
+
+# /giveaway create-batch - most giveaways per file and how many giveaway messages it posts at once
+BATCH_MAX_GIVEAWAYS = 50
+BATCH_POST_CONCURRENCY = int(os.getenv("BATCH_POST_CONCURRENCY", "5"))
+
+# Seconds a handler may run before its interaction is deferred (Discord drops unacknowledged interactions after 3s)
+ACK_DEFER_AFTER = 2.0
+
+# Winner payouts - parallel role grants/DMs and attempts per Discord call
+PAYOUT_CONCURRENCY = int(os.getenv("PAYOUT_CONCURRENCY", "5"))
+PAYOUT_RETRIES = 3
+
+# Participants shown per page of the participants viewer
+PARTICIPANTS_PER_PAGE = 50
+
 # Channel IDs
 GIVEAWAY_LOG_CHANNEL_ID = 1468897829035573291
 
@@ -35,29 +273,879 @@ GIVEAWAY_LOG_CHANNEL_ID = 1468897829035573291
 THUMBNAIL_URL = "https://oldschool.runescape.wiki/images/thumb/Coins_detail.png/240px-Coins_detail.png?404bc"
 BANNER_URL = "https://i.postimg.cc/HkTwJVLb/thieving-giveaway-banner-1.png"
 
-# Load wallet data
-def load_wallets():
-    if os.path.exists(WALLET_FILE):
-        with open(WALLET_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+# Base64 of little-endian packed unsigned 64-bit integers (8 bytes each), the compact form of ID arrays on disk
+def encode_uint64s(values):
+    if sys.byteorder != 'little':
+        values = array('Q', values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode('ascii')
+
+def decode_uint64s(value):
+    values = array('Q')
+    values.frombytes(base64.b64decode(value))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+# Giveaway entries - user IDs packed as 64-bit integers in entry order, with a hash index for O(1) duplicate checks
+class EntrySet:
+    def __init__(self, user_ids=()):
+        self.ids = array('Q')
+        self.index = set()
+        for user_id in user_ids:
+            self.add(user_id)
+
+    def add(self, user_id):
+        """Add a user, returns False if they are already in the set"""
+        user_id = int(user_id)
+        if user_id in self.index:
+            return False
+        self.index.add(user_id)
+        self.ids.append(user_id)
+        return True
+
+    def __contains__(self, user_id):
+        return int(user_id) in self.index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def to_json(self):
+        """Encode as base64 of the little-endian packed IDs (8 bytes per entry)"""
+        return encode_uint64s(self.ids)
+
+    @classmethod
+    def from_json(cls, value):
+        """Decode from to_json() output, or from the legacy list of string IDs"""
+        if isinstance(value, cls):
+            return value
+        if not isinstance(value, str):
+            return cls(value)
+        entries = cls()
+        entries.ids = decode_uint64s(value)
+        entries.index = set(entries.ids)
+        return entries
+
+# JSON encoder hook for the compact types stored in the data files
+def json_default(obj):
+    if isinstance(obj, (EntrySet, DrawPool)):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# Convert each giveaway's stored entries into an EntrySet
+def decode_giveaways(giveaways):
+    for giveaway in giveaways.values():
+        giveaway['entries'] = EntrySet.from_json(giveaway.get('entries', []))
+    return giveaways
+
+# Write a JSON file via temp file + os.replace so a crash never leaves it truncated (the JSON backend's real save cost -
+# its save_* calls only mark the write-behind cache dirty)
+@instrumented("write_json_atomic", metric="giveaway_storage_seconds", label="op")
+def write_json_atomic(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=json_default)
+        f.flush()
+        os.fsync(f.fileno())
+        count_io('write', f.tell())
+    os.replace(temp_path, path)
+
+# Every storage operation runs on this one thread in submission order, so blocking I/O never stalls the event loop
+storage_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+
+# Run a blocking call on the storage thread
+async def run_in_storage_thread(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(storage_executor, functools.partial(func, *args))
+
+# In-memory copy of a JSON data file with coalesced write-behind flushing
+class JsonFileCache:
+    def __init__(self, path, flush_interval_ms, decode=None):
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self.decode = decode
+        self.data = None
+        self.dirty = False
+        self.flush_handle = None
+        self.loop = None  # event loop that times the flushes, set by bind_loop()
+
+    def load(self):
+        if self.data is None:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.data = json.load(f)
+                count_io('read', os.path.getsize(self.path))
+            else:
+                self.data = {}
+            if self.decode:
+                self.data = self.decode(self.data)
+        return self.data
+
+    def save(self, data):
+        """Mark the data dirty, it is written at most once per flush interval (safe to call from the storage thread)"""
+        self.data = data
+        self.dirty = True
+        if self.flush_handle is not None:
+            return
+        if self.loop is None or self.loop.is_closed():
+            # No event loop (startup, CLI) - write straight away
+            self.flush()
+            return
+        self.flush_handle = self.loop.call_soon_threadsafe(self._flush_later)
+
+    def _flush_later(self):
+        self.flush_handle = self.loop.call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        # The write itself happens on the storage thread, after any saves already queued there
+        self.flush_handle = None
+        self.loop.run_in_executor(storage_executor, self.flush)
 
-# Save wallet data
-def save_wallets(wallets):
-    with open(WALLET_FILE, 'w') as f:
-        json.dump(wallets, f, indent=4)
+    def flush(self):
+        """Atomically write the file if dirty (temp file + os.replace)"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.dirty:
+            return
+        write_json_atomic(self.path, self.data)
+        self.dirty = False
 
-# Load giveaway data
-def load_giveaways():
-    if os.path.exists(GIVEAWAY_FILE):
-        with open(GIVEAWAY_FILE, 'r') as f:
+# Load legacy wallet data (wallets.json, seeds the wallet ledger)
+@instrumented("load_wallets", metric="giveaway_storage_seconds", label="op")
+def load_wallets(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
             return json.load(f)
     return {}
 
-# Save giveaway data
-def save_giveaways(giveaways):
-    with open(GIVEAWAY_FILE, 'w') as f:
-        json.dump(giveaways, f, indent=4)
+# Storage backend interface - one guild's giveaways, their entries, wallet balances and settings
+class Storage:
+    def __init__(self, data_dir="", read_only=False):
+        self.data_dir = data_dir
+        self.read_only = read_only  # offline tools - never create, migrate or repair anything
+
+    def data_file(self, name):
+        """Path of a data file in this partition (an empty data_dir keeps the configured top-level path)"""
+        return os.path.join(self.data_dir, os.path.basename(name)) if self.data_dir else name
+
+    def get_giveaway(self, giveaway_id):
+        """Return the giveaway record (without its entries) or None"""
+        raise NotImplementedError
+
+    def giveaway_ids(self):
+        """Return every stored giveaway ID, to read the records one at a time"""
+        raise NotImplementedError
+
+    def active_giveaways(self):
+        """Return {giveaway_id: giveaway} for giveaways that haven't ended"""
+        raise NotImplementedError
+
+    def find_by_message(self, message_id):
+        """Return (giveaway_id, giveaway) for a giveaway message ID, or (None, None)"""
+        raise NotImplementedError
+
+    def save_giveaway(self, giveaway_id, giveaway):
+        """Insert or update a giveaway record, entries are left untouched"""
+        raise NotImplementedError
+
+    def save_giveaway_batch(self, giveaways):
+        """save_giveaway() for each of {giveaway_id: giveaway} in a single write"""
+        raise NotImplementedError
+
+    def archivable_giveaways(self, cutoff):
+        """Return {giveaway_id: giveaway with 'entries'} for ended giveaways whose end_time is before cutoff"""
+        raise NotImplementedError
+
+    def remove_giveaways(self, giveaway_ids):
+        """Delete giveaways and their entries from the hot store"""
+        raise NotImplementedError
+
+    def claim_due_giveaway(self, owner, now, expires):
+        """Lease the earliest due, unended giveaway that nobody else holds - returns (giveaway_id, giveaway) or None"""
+        raise NotImplementedError
+
+    def claim_giveaway(self, giveaway_id, owner, now, expires):
+        """Lease a specific unended giveaway (e.g. ended early by hand), returns False if someone else holds it"""
+        raise NotImplementedError
+
+    def renew_lease(self, giveaway_id, owner, expires):
+        """Extend a lease, returns False if it was lost"""
+        raise NotImplementedError
+
+    def release_lease(self, giveaway_id, owner):
+        raise NotImplementedError
+
+    def add_entry(self, giveaway_id, user_id):
+        """Add an entry, returns False if the user had already entered"""
+        raise NotImplementedError
+
+    def get_entries(self, giveaway_id):
+        """Return the giveaway's EntrySet (treat as read-only)"""
+        raise NotImplementedError
+
+    def count_entries(self, giveaway_id):
+        raise NotImplementedError
+
+    def load_wallet_state(self):
+        """Return (snapshot balances, ledger transactions recorded after the snapshot, ledger position read up to)"""
+        raise NotImplementedError
+
+    def append_transactions(self, transactions, position, check):
+        """Durably append a batch of wallet transactions in a single write, holding the ledger's write lock from
+        check(transactions appended since position) - which raises to abort - until the append. Returns
+        (check's result, new ledger position)"""
+        raise NotImplementedError
+
+    def write_wallet_snapshot(self):
+        """Fold every transaction appended so far (by any process) into the stored balances"""
+        raise NotImplementedError
+
+    def giveaway_credits(self, giveaway_id, reason):
+        """Return the IDs of users the ledger shows as credited for a giveaway with this reason"""
+        raise NotImplementedError
+
+    def load_config(self):
+        """Return the guild settings saved with save_config(), or {}"""
+        raise NotImplementedError
+
+    def save_config(self, config):
+        raise NotImplementedError
+
+    def bind_loop(self, loop):
+        """Called with the event loop the backend is being used from"""
+        pass
+
+    def flush(self):
+        """Make every change saved so far durable before returning"""
+        pass
+
+    def close(self):
+        pass
+
+# JSON file storage (cached in memory, flushed in the background)
+class JsonStorage(Storage):
+    def __init__(self, data_dir="", read_only=False):
+        super().__init__(data_dir, read_only)
+        self.giveaway_cache = JsonFileCache(self.data_file(GIVEAWAY_FILE), FLUSH_INTERVAL_MS, decode=decode_giveaways)
+        self.ledger_file = self.data_file(WALLET_LEDGER_FILE)
+        self.snapshot_file = self.data_file(WALLET_SNAPSHOT_FILE)
+        self.by_message = None  # message_id -> giveaway_id
+        self.active = None      # giveaway_ids that haven't ended
+        self.ended = None       # giveaway_ids that have ended
+        self.leases = {}        # giveaway_id -> (owner, expires), in memory as the JSON files belong to one process
+
+    def load_giveaways(self):
+        return self.giveaway_cache.load()
+
+    def save_giveaways(self, giveaways):
+        self.giveaway_cache.save(giveaways)
+
+    def _indexes(self):
+        if self.by_message is None:
+            self.by_message, self.active, self.ended = {}, set(), set()
+            for giveaway_id, giveaway in self.load_giveaways().items():
+                self._index(giveaway_id, giveaway)
+
+    def _index(self, giveaway_id, giveaway):
+        self.by_message[giveaway['message_id']] = giveaway_id
+        if giveaway.get('ended', False):
+            self.active.discard(giveaway_id)
+            self.ended.add(giveaway_id)
+        else:
+            self.ended.discard(giveaway_id)
+            self.active.add(giveaway_id)
+
+    def get_giveaway(self, giveaway_id):
+        # Copies, so callers on the event loop never mutate a record the storage thread is writing out
+        giveaway = self.load_giveaways().get(giveaway_id)
+        return dict(giveaway) if giveaway else None
+
+    def giveaway_ids(self):
+        return list(self.load_giveaways())
+
+    def active_giveaways(self):
+        self._indexes()
+        giveaways = self.load_giveaways()
+        return {giveaway_id: dict(giveaways[giveaway_id]) for giveaway_id in self.active}
+
+    def find_by_message(self, message_id):
+        self._indexes()
+        giveaway_id = self.by_message.get(message_id)
+        if giveaway_id is None:
+            return None, None
+        return giveaway_id, dict(self.load_giveaways()[giveaway_id])
+
+    def save_giveaway(self, giveaway_id, giveaway):
+        self.save_giveaway_batch({giveaway_id: giveaway})
+
+    def save_giveaway_batch(self, giveaways):
+        self._indexes()
+        stored_giveaways = self.load_giveaways()
+        for giveaway_id, giveaway in giveaways.items():
+            stored = stored_giveaways.get(giveaway_id)
+            record = dict(giveaway)
+            record['entries'] = stored['entries'] if stored else EntrySet.from_json(giveaway.get('entries', []))
+            stored_giveaways[giveaway_id] = record
+            self._index(giveaway_id, record)
+        self.save_giveaways(stored_giveaways)
+
+    def archivable_giveaways(self, cutoff):
+        self._indexes()
+        giveaways = self.load_giveaways()
+        return {
+            giveaway_id: giveaways[giveaway_id] for giveaway_id in self.ended
+            if datetime.fromisoformat(giveaways[giveaway_id]['end_time']) < cutoff
+        }
+
+    def remove_giveaways(self, giveaway_ids):
+        self._indexes()
+        giveaways = self.load_giveaways()
+        for giveaway_id in giveaway_ids:
+            giveaway = giveaways.pop(giveaway_id)
+            self.by_message.pop(giveaway['message_id'], None)
+            self.active.discard(giveaway_id)
+            self.ended.discard(giveaway_id)
+        self.save_giveaways(giveaways)
+
+    def _lease_free(self, giveaway_id, owner, now):
+        lease = self.leases.get(giveaway_id)
+        return lease is None or lease[1] < now or lease[0] == owner
+
+    def claim_due_giveaway(self, owner, now, expires):
+        self._indexes()
+        giveaways = self.load_giveaways()
+        due = [
+            (giveaways[giveaway_id]['end_time'], giveaway_id) for giveaway_id in self.active
+            if datetime.fromisoformat(giveaways[giveaway_id]['end_time']) <= now and self._lease_free(giveaway_id, None, now)
+        ]
+        if not due:
+            return None
+        _, giveaway_id = min(due)
+        self.leases[giveaway_id] = (owner, expires)
+        return giveaway_id, dict(giveaways[giveaway_id])
+
+    def claim_giveaway(self, giveaway_id, owner, now, expires):
+        self._indexes()
+        if giveaway_id not in self.active or not self._lease_free(giveaway_id, owner, now):
+            return False
+        self.leases[giveaway_id] = (owner, expires)
+        return True
+
+    def renew_lease(self, giveaway_id, owner, expires):
+        if self.leases.get(giveaway_id, (None,))[0] != owner:
+            return False
+        self.leases[giveaway_id] = (owner, expires)
+        return True
+
+    def release_lease(self, giveaway_id, owner):
+        if self.leases.get(giveaway_id, (None,))[0] == owner:
+            del self.leases[giveaway_id]
+
+    def add_entry(self, giveaway_id, user_id):
+        giveaways = self.load_giveaways()
+        if not giveaways[giveaway_id]['entries'].add(user_id):
+            return False
+        self.save_giveaways(giveaways)
+        return True
+
+    def get_entries(self, giveaway_id):
+        giveaway = self.load_giveaways().get(giveaway_id)
+        return giveaway['entries'] if giveaway else EntrySet()
+
+    def count_entries(self, giveaway_id):
+        return len(self.get_entries(giveaway_id))
+
+    def load_wallet_state(self):
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                snapshot = json.load(f)
+        else:
+            snapshot = {'ledger_offset': 0, 'balances': load_wallets(self.data_file(WALLET_FILE))}
+        balances = {int(user_id): balance for user_id, balance in snapshot['balances'].items()}
+        
+        transactions = []
+        position = snapshot['ledger_offset']
+        if os.path.exists(self.ledger_file):
+            with open(self.ledger_file, 'rb' if self.read_only else 'rb+') as f:
+                f.seek(position)
+                while True:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if not line.endswith(b"\n"):
+                        # Torn write from a crash - drop the partial line
+                        if not self.read_only:
+                            f.truncate(position)
+                        break
+                    transactions.append(json.loads(line))
+                    position = f.tell()
+        return balances, transactions, position
+
+    def append_transactions(self, transactions, position, check):
+        # One process owns the JSON files, so the ledger past position is normally empty
+        with open(self.ledger_file, 'ab+') as f:
+            f.seek(position)
+            result = check([json.loads(line) for line in f])
+            count_io('write', f.write("".join(json.dumps(txn) + "\n" for txn in transactions).encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+            return result, f.tell()
+
+    def write_wallet_snapshot(self):
+        balances, transactions, offset = self.load_wallet_state()
+        fold_transactions(balances, transactions)
+        write_json_atomic(self.snapshot_file, {'ledger_offset': offset, 'balances': {str(k): v for k, v in balances.items()}})
+
+    def giveaway_credits(self, giveaway_id, reason):
+        # Full scan - only runs when resuming an interrupted ending
+        credited = set()
+        if os.path.exists(self.ledger_file):
+            with open(self.ledger_file, 'r') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    txn = json.loads(line)
+                    if txn['giveaway_id'] == giveaway_id and txn['reason'] == reason:
+                        credited.add(txn['user_id'])
+        return credited
+
+    def load_config(self):
+        path = self.data_file(GUILD_CONFIG_FILE)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_config(self, config):
+        write_json_atomic(self.data_file(GUILD_CONFIG_FILE), config)
+
+    def bind_loop(self, loop):
+        self.giveaway_cache.loop = loop
+
+    def flush(self):
+        self.giveaway_cache.flush()
+
+    def close(self):
+        # Force the final write-behind flush on shutdown
+        self.giveaway_cache.flush()
+
+# SQLite storage in WAL mode - one row per giveaway, entry and wallet
+class SqliteStorage(Storage):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS giveaways (
+            giveaway_id TEXT PRIMARY KEY,
+            message_id INTEGER,
+            end_time TEXT NOT NULL,
+            ended INTEGER NOT NULL DEFAULT 0,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_giveaways_message ON giveaways (message_id);
+        CREATE INDEX IF NOT EXISTS idx_giveaways_active ON giveaways (ended, end_time);
+        CREATE TABLE IF NOT EXISTS entries (
+            giveaway_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_user ON entries (giveaway_id, user_id);
+        CREATE TABLE IF NOT EXISTS wallets (
+            user_id INTEGER PRIMARY KEY,
+            balance INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS wallet_ledger (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            giveaway_id TEXT,
+            actor_id INTEGER,
+            time TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_wallet_ledger_user ON wallet_ledger (user_id);
+        CREATE INDEX IF NOT EXISTS idx_wallet_ledger_giveaway ON wallet_ledger (giveaway_id);
+    """
+
+    def __init__(self, data_dir="", read_only=False):
+        super().__init__(data_dir, read_only)
+        self.path = self.data_file(DATABASE_FILE)
+        if read_only:
+            self.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA busy_timeout=5000")
+            return
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")  # other bot processes may hold the write lock briefly
+        self.db.executescript(self.SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(giveaways)")}
+        if 'lease_owner' not in columns:
+            self.db.execute("ALTER TABLE giveaways ADD COLUMN lease_owner TEXT")
+            self.db.execute("ALTER TABLE giveaways ADD COLUMN lease_expires TEXT")
+        self.migrate_json()
+
+    def migrate_json(self):
+        """One-shot import of the legacy wallets.json / giveaways.json files"""
+        if self.db.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        giveaways = JsonFileCache(self.data_file(GIVEAWAY_FILE), FLUSH_INTERVAL_MS, decode=decode_giveaways).load()
+        wallets = load_wallets(self.data_file(WALLET_FILE))
+        with self.db:
+            self.db.execute("BEGIN")
+            for giveaway_id, giveaway in giveaways.items():
+                self._write_giveaway(giveaway_id, giveaway)
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO entries (giveaway_id, user_id) VALUES (?, ?)",
+                    [(giveaway_id, int(user_id)) for user_id in giveaway.get('entries', [])]
+                )
+                self.db.execute(
+                    "UPDATE giveaways SET entry_count = (SELECT COUNT(*) FROM entries WHERE giveaway_id = ?) WHERE giveaway_id = ?",
+                    (giveaway_id, giveaway_id)
+                )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO wallets (user_id, balance) VALUES (?, ?)",
+                [(int(user_id), balance) for user_id, balance in wallets.items()]
+            )
+            self.db.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.utcnow().isoformat(),))
+        if giveaways or wallets:
+            print(f"Migrated {len(giveaways)} giveaway(s) and {len(wallets)} wallet(s) into {self.path}")
+
+    def _write_giveaway(self, giveaway_id, giveaway):
+        data = {k: v for k, v in giveaway.items() if k not in ('entries', 'entry_count')}
+        self.db.execute(
+            "INSERT INTO giveaways (giveaway_id, message_id, end_time, ended, data) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (giveaway_id) DO UPDATE SET message_id = excluded.message_id, end_time = excluded.end_time, "
+            "ended = excluded.ended, data = excluded.data",
+            (giveaway_id, giveaway.get('message_id'), giveaway['end_time'], int(giveaway.get('ended', False)), json.dumps(data, default=json_default))
+        )
+
+    def _row_to_giveaway(self, row):
+        giveaway = json.loads(row[1])
+        giveaway['ended'] = bool(row[2])
+        giveaway['entry_count'] = row[3]
+        return giveaway
+
+    def get_giveaway(self, giveaway_id):
+        row = self.db.execute(
+            "SELECT giveaway_id, data, ended, entry_count FROM giveaways WHERE giveaway_id = ?", (giveaway_id,)
+        ).fetchone()
+        return self._row_to_giveaway(row) if row else None
+
+    def giveaway_ids(self):
+        return [row[0] for row in self.db.execute("SELECT giveaway_id FROM giveaways ORDER BY rowid")]
+
+    def active_giveaways(self):
+        rows = self.db.execute(
+            "SELECT giveaway_id, data, ended, entry_count FROM giveaways WHERE ended = 0 ORDER BY end_time"
+        )
+        return {row[0]: self._row_to_giveaway(row) for row in rows}
+
+    def find_by_message(self, message_id):
+        row = self.db.execute(
+            "SELECT giveaway_id, data, ended, entry_count FROM giveaways WHERE message_id = ?", (message_id,)
+        ).fetchone()
+        return (row[0], self._row_to_giveaway(row)) if row else (None, None)
+
+    def save_giveaway(self, giveaway_id, giveaway):
+        self._write_giveaway(giveaway_id, giveaway)
+
+    def save_giveaway_batch(self, giveaways):
+        with self.db:
+            self.db.execute("BEGIN")
+            for giveaway_id, giveaway in giveaways.items():
+                self._write_giveaway(giveaway_id, giveaway)
+
+    def archivable_giveaways(self, cutoff):
+        rows = self.db.execute(
+            "SELECT giveaway_id, data, ended, entry_count FROM giveaways WHERE ended = 1 AND end_time < ?",
+            (cutoff.isoformat(),)
+        ).fetchall()
+        giveaways = {}
+        for row in rows:
+            giveaway = self._row_to_giveaway(row)
+            giveaway['entries'] = self.get_entries(row[0])
+            del giveaway['entry_count']
+            giveaways[row[0]] = giveaway
+        return giveaways
+
+    def remove_giveaways(self, giveaway_ids):
+        with self.db:
+            self.db.execute("BEGIN")
+            for giveaway_id in giveaway_ids:
+                self.db.execute("DELETE FROM entries WHERE giveaway_id = ?", (giveaway_id,))
+                self.db.execute("DELETE FROM giveaways WHERE giveaway_id = ?", (giveaway_id,))
+
+    def claim_due_giveaway(self, owner, now, expires):
+        # IMMEDIATE takes the write lock up front, so two processes can't both see the same giveaway as free
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute(
+                "SELECT giveaway_id, data, ended, entry_count FROM giveaways WHERE ended = 0 AND end_time <= ? "
+                "AND (lease_expires IS NULL OR lease_expires < ?) ORDER BY end_time LIMIT 1",
+                (now.isoformat(), now.isoformat())
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE giveaways SET lease_owner = ?, lease_expires = ? WHERE giveaway_id = ?",
+                (owner, expires.isoformat(), row[0])
+            )
+        return row[0], self._row_to_giveaway(row)
+
+    def claim_giveaway(self, giveaway_id, owner, now, expires):
+        cursor = self.db.execute(
+            "UPDATE giveaways SET lease_owner = ?, lease_expires = ? WHERE giveaway_id = ? AND ended = 0 "
+            "AND (lease_expires IS NULL OR lease_expires < ? OR lease_owner = ?)",
+            (owner, expires.isoformat(), giveaway_id, now.isoformat(), owner)
+        )
+        return cursor.rowcount == 1
+
+    def renew_lease(self, giveaway_id, owner, expires):
+        cursor = self.db.execute(
+            "UPDATE giveaways SET lease_expires = ? WHERE giveaway_id = ? AND lease_owner = ?",
+            (expires.isoformat(), giveaway_id, owner)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, giveaway_id, owner):
+        self.db.execute(
+            "UPDATE giveaways SET lease_owner = NULL, lease_expires = NULL WHERE giveaway_id = ? AND lease_owner = ?",
+            (giveaway_id, owner)
+        )
+
+    def add_entry(self, giveaway_id, user_id):
+        with self.db:
+            self.db.execute("BEGIN")
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO entries (giveaway_id, user_id) VALUES (?, ?)", (giveaway_id, int(user_id))
+            )
+            if cursor.rowcount == 0:
+                return False
+            self.db.execute("UPDATE giveaways SET entry_count = entry_count + 1 WHERE giveaway_id = ?", (giveaway_id,))
+        return True
+
+    def get_entries(self, giveaway_id):
+        rows = self.db.execute("SELECT user_id FROM entries WHERE giveaway_id = ? ORDER BY rowid", (giveaway_id,))
+        return EntrySet(row[0] for row in rows)
+
+    def count_entries(self, giveaway_id):
+        row = self.db.execute("SELECT entry_count FROM giveaways WHERE giveaway_id = ?", (giveaway_id,)).fetchone()
+        return row[0] if row else 0
+
+    LEDGER_COLUMNS = ('user_id', 'amount', 'type', 'reason', 'giveaway_id', 'actor_id', 'time')
+
+    def ledger_since(self, seq):
+        """Return (transactions after seq, the last seq read)"""
+        rows = self.db.execute(
+            f"SELECT seq, {', '.join(self.LEDGER_COLUMNS)} FROM wallet_ledger WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        return [dict(zip(self.LEDGER_COLUMNS, row[1:])) for row in rows], rows[-1][0] if rows else seq
+
+    def load_wallet_state(self):
+        # One read transaction, so a snapshot written by another process can't land between the two reads
+        with self.db:
+            self.db.execute("BEGIN")
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'wallet_snapshot_seq'").fetchone()
+            balances = dict(self.db.execute("SELECT user_id, balance FROM wallets"))
+            transactions, seq = self.ledger_since(int(row[0]) if row else 0)
+        return balances, transactions, seq
+
+    def append_transactions(self, transactions, position, check):
+        with self.db:
+            # Take the write lock before reading, so no other process appends between the check and the insert
+            self.db.execute("BEGIN IMMEDIATE")
+            appended, position = self.ledger_since(position)
+            result = check(appended)
+            self.db.executemany(
+                f"INSERT INTO wallet_ledger ({', '.join(self.LEDGER_COLUMNS)}) VALUES ({', '.join('?' * len(self.LEDGER_COLUMNS))})",
+                [tuple(txn[column] for column in self.LEDGER_COLUMNS) for txn in transactions]
+            )
+            position = self.db.execute("SELECT COALESCE(MAX(seq), ?) FROM wallet_ledger", (position,)).fetchone()[0]
+        return result, position
+
+    def write_wallet_snapshot(self):
+        # Recomputed from the ledger under the write lock - other processes share the file and append to it too
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'wallet_snapshot_seq'").fetchone()
+            self.db.execute(
+                "INSERT INTO wallets (user_id, balance) SELECT user_id, SUM(amount) FROM wallet_ledger WHERE seq > ? GROUP BY user_id "
+                "ON CONFLICT (user_id) DO UPDATE SET balance = balance + excluded.balance",
+                (int(row[0]) if row else 0,)
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('wallet_snapshot_seq', (SELECT COALESCE(MAX(seq), 0) FROM wallet_ledger))"
+            )
+
+    def giveaway_credits(self, giveaway_id, reason):
+        rows = self.db.execute("SELECT user_id FROM wallet_ledger WHERE giveaway_id = ? AND reason = ?", (giveaway_id, reason))
+        return {row[0] for row in rows}
+
+    def load_config(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'guild_config'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_config(self, config):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('guild_config', ?)", (json.dumps(config),))
+
+    def close(self):
+        self.db.close()
+
+# Create the configured storage backend for one partition directory
+def open_storage(data_dir="", read_only=False):
+    if STORAGE_BACKEND == "json":
+        storage = JsonStorage(data_dir, read_only)
+    elif STORAGE_BACKEND == "sqlite":
+        storage = SqliteStorage(data_dir, read_only)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    
+    # Time every storage backend call when metrics are on
+    if metrics:
+        for name in ('get_giveaway', 'giveaway_ids', 'active_giveaways', 'find_by_message', 'save_giveaway',
+                     'save_giveaway_batch', 'archivable_giveaways', 'remove_giveaways', 'add_entry', 'get_entries', 'count_entries',
+                     'load_wallet_state', 'append_transactions', 'write_wallet_snapshot', 'flush'):
+            setattr(storage, name, instrumented(name, metric="giveaway_storage_seconds", label="op")(getattr(storage, name)))
+    return storage
+
+# Async front for a storage backend - each method call runs on the storage thread and is awaited
+class AsyncStorage:
+    def __init__(self, backend):
+        self.backend = backend
+        self.loop = None
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+        
+        async def call(*args):
+            loop = asyncio.get_running_loop()
+            if loop is not self.loop:
+                self.loop = loop
+                self.backend.bind_loop(loop)
+            return await run_in_storage_thread(method, *args)
+        
+        call.__name__ = name
+        return call
+
+# Compressed, append-only archive of ended giveaways - one JSON line per giveaway, entries included
+class GiveawayArchive:
+    def __init__(self, path):
+        self.path = path
+        self.end = 0  # end of the complete gzip members known so far
+
+    def valid_length(self, start=0):
+        """End of the run of complete gzip members starting at offset start (a member boundary)"""
+        end = start
+        decompressor = zlib.decompressobj(wbits=31)
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            while chunk := f.read(1 << 16):
+                while chunk:
+                    try:
+                        decompressor.decompress(chunk)
+                    except zlib.error:
+                        return end
+                    if not decompressor.eof:
+                        start += len(chunk)
+                        break
+                    end = start = start + len(chunk) - len(decompressor.unused_data)
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=31)
+        return end
+
+    def append(self, giveaways):
+        """Append {giveaway_id: giveaway} as a new gzip member"""
+        lines = "".join(
+            json.dumps({'giveaway_id': giveaway_id, **giveaway}, default=json_default) + "\n"
+            for giveaway_id, giveaway in giveaways.items()
+        )
+        with open(self.path, 'ab') as f:
+            if f.tell() > self.end:
+                # Members appended since (first use, or another process) are kept - a torn append from a crash is
+                # cut off (and kept aside) so the new member doesn't land behind it, unreadable
+                self.end = self.valid_length(self.end)
+            if f.tell() > self.end:
+                with open(self.path, 'rb') as torn, open(self.path + ".damaged", 'ab') as out:
+                    torn.seek(self.end)
+                    shutil.copyfileobj(torn, out)
+                print(f"Giveaway archive had {f.tell() - self.end} damaged byte(s) at the end, moved to {self.path}.damaged")
+                f.truncate(self.end)
+            with gzip.GzipFile(fileobj=f, mode='ab') as gz:
+                gz.write(lines.encode('utf-8'))
+            f.flush()
+            count_io('write', f.tell() - self.end)
+            os.fsync(f.fileno())
+            self.end = f.tell()
+
+    def records(self):
+        """Stream (giveaway_id, giveaway) pairs, oldest first"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    yield record.pop('giveaway_id'), record
+        except (EOFError, gzip.BadGzipFile, zlib.error, ValueError) as e:
+            # Torn append from a crash - everything before it is still readable
+            print(f"Giveaway archive ends with a damaged record: {e}")
+
+    def find_by_message(self, message_id):
+        """Newest record for the message - rerolls append an updated copy rather than rewriting the archive"""
+        found_id, found = None, None
+        for giveaway_id, giveaway in self.records():
+            if giveaway['message_id'] == message_id:
+                found_id, found = giveaway_id, giveaway
+        if found is not None:
+            found['entries'] = EntrySet.from_json(found.get('entries', []))
+            found['archived'] = True
+        return found_id, found
+
+# On-disk queue of giveaway log embeds not yet delivered to the log channel - one JSON line per embed, oldest first
+class LogSpool:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        embeds = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    embeds.append(json.loads(line))
+                except ValueError:
+                    # Torn write from a crash (possibly with a later append run into it)
+                    print(f"Skipping a damaged line in {self.path}")
+        return embeds
+
+    def append(self, embeds):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            count_io('write', f.write("".join(json.dumps(embed) + "\n" for embed in embeds)))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def discard(self, count):
+        """Drop the oldest count embeds (delivered) - appends made since they were read are kept"""
+        embeds = self.read()[count:]
+        if not embeds:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            count_io('write', f.write("".join(json.dumps(embed) + "\n" for embed in embeds)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
 
 # Parse amount (supports k, m, b suffixes)
 def parse_amount(amount_str):
@@ -87,16 +1175,159 @@ def format_amount(amount):
         return f"{amount / 1_000:.1f}k".rstrip('0').rstrip('.')
     return str(amount)
 
-# Get user wallet balance
-def get_balance(user_id):
-    wallets = load_wallets()
-    return wallets.get(str(user_id), 0)
+# Build a wallet ledger transaction (positive amount = credit, negative = debit)
+def wallet_transaction(user_id, amount, reason, giveaway_id=None, actor_id=None):
+    return {
+        'user_id': int(user_id),
+        'amount': amount,
+        'type': 'credit' if amount >= 0 else 'debit',
+        'reason': reason,
+        'giveaway_id': giveaway_id,
+        'actor_id': actor_id,
+        'time': datetime.utcnow().isoformat()
+    }
+
+# Apply ledger transactions to a {user_id: balance} dict in place
+def fold_transactions(balances, transactions):
+    for txn in transactions:
+        balances[txn['user_id']] = balances.get(txn['user_id'], 0) + txn['amount']
+    return balances
+
+# Append-only wallet ledger with an in-memory balance index and periodic snapshots. Other bot processes sharing the
+# SQLite file append to the same ledger, so each commit first folds in whatever they appended since the last one
+class WalletLedger:
+    def __init__(self, storage, snapshot_every):
+        self.storage = storage  # AsyncStorage
+        self.snapshot_every = snapshot_every
+        self.balances = None
+        self.position = None  # ledger position the balance index is current to
+        self.since_snapshot = 0
+        self.lock = asyncio.Lock()  # commits check balances, then await the append
+
+    async def load(self):
+        if self.balances is None:
+            balances, transactions, position = await self.storage.load_wallet_state()
+            if self.balances is None:
+                self.balances = fold_transactions(balances, transactions)
+                self.position = position
+                self.since_snapshot = len(transactions)
+        return self.balances
+
+    async def balance(self, user_id):
+        return (await self.load()).get(int(user_id), 0)
+
+    async def commit(self, transactions):
+        """Apply a batch of transactions atomically in one write, returns the new balances"""
+        async with self.lock:
+            balances = await self.load()
+            
+            def check(appended):
+                # Runs on the storage thread under the ledger's write lock - balances only change after it returns
+                current = fold_transactions({txn['user_id']: balances.get(txn['user_id'], 0) for txn in appended}, appended)
+                updated = {}
+                for txn in transactions:
+                    user_id = txn['user_id']
+                    updated[user_id] = updated.get(user_id, current.get(user_id, balances.get(user_id, 0))) + txn['amount']
+                    if updated[user_id] < 0:
+                        raise ValueError(f"Insufficient balance for {user_id}")
+                return current, updated, len(appended)
+            
+            (current, updated, appended), self.position = await self.storage.append_transactions(transactions, self.position, check)
+            balances.update(current)
+            balances.update(updated)
+            
+            self.since_snapshot += appended + len(transactions)
+            if self.since_snapshot >= self.snapshot_every:
+                # The storage thread writes it while commits carry on
+                self.since_snapshot = 0
+                await self.storage.write_wallet_snapshot()
+        return updated
+
+    def final_snapshot(self):
+        """Synchronous snapshot for shutdown, once the storage thread has drained"""
+        if self.balances is not None and self.since_snapshot:
+            self.storage.backend.write_wallet_snapshot()
+            self.since_snapshot = 0
+
+# Settings a guild starts with - the primary guild inherits the constants above, other guilds configure their own roles
+def default_guild_config(guild_id):
+    primary = guild_id == PRIMARY_GUILD_ID
+    return {
+        'support_role_id': SUPPORT_ROLE_ID if primary else None,
+        'booster_role_id': BOOSTER_ROLE_ID if primary else None,
+        'winners_circle_role_id': WINNERS_CIRCLE_ROLE_ID if primary else None,
+        'role_bonuses': dict(ROLE_BONUSES) if primary else {},
+        'log_channel_id': GIVEAWAY_LOG_CHANNEL_ID if primary else None,
+        'thumbnail_url': THUMBNAIL_URL,
+        'banner_url': BANNER_URL
+    }
+
+# Directory of a guild's partition ("" - the top-level files - for the primary guild)
+def partition_dir(guild_id):
+    return "" if guild_id == PRIMARY_GUILD_ID else os.path.join(DATA_DIR, str(guild_id))
+
+# One guild's partition - its own storage files, wallet ledger, archive and settings
+class GuildData:
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        data_dir = partition_dir(guild_id)
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+        self.backend = open_storage(data_dir)
+        self.storage = AsyncStorage(self.backend)
+        self.wallets = WalletLedger(self.storage, WALLET_SNAPSHOT_EVERY)
+        self.archive = GiveawayArchive(self.backend.data_file(ARCHIVE_FILE))
+        self.log_spool = LogSpool(self.backend.data_file(LOG_SPOOL_FILE))
+        self.config = default_guild_config(guild_id)
+        self.config.update(self.backend.load_config())
+        self.config['role_bonuses'] = {int(role_id): bonus for role_id, bonus in self.config['role_bonuses'].items()}
+
+    async def update_config(self, changes):
+        self.config.update(changes)
+        await self.storage.save_config(dict(self.config))
+        role_weights.invalidate_guild(self.guild_id)
+
+    def close(self):
+        """Final snapshot and flush - call after storage_executor has shut down"""
+        self.wallets.final_snapshot()
+        self.backend.close()
+
+guild_data = {}  # guild_id -> GuildData, opened on first use
+
+# Get a guild's data partition, opening it if needed (blocking - on the event loop use open_guild_data() first)
+def get_guild_data(guild_id):
+    data = guild_data.get(guild_id)
+    if data is None:
+        data = guild_data[guild_id] = GuildData(guild_id)
+    return data
+
+# Get a guild's data partition, opening it on the storage thread (connect, schema, migration, settings) the first time
+async def open_guild_data(guild_id):
+    data = guild_data.get(guild_id)
+    if data is None:
+        # The storage thread runs one call at a time, so concurrent first uses can't open a partition twice
+        data = await run_in_storage_thread(get_guild_data, guild_id)
+    return data
 
-# Set user wallet balance
-def set_balance(user_id, amount):
-    wallets = load_wallets()
-    wallets[str(user_id)] = amount
-    save_wallets(wallets)
+# Open every partition on disk (the primary guild's included)
+def load_guild_data():
+    guild_ids = {PRIMARY_GUILD_ID} if PRIMARY_GUILD_ID else set()
+    if os.path.isdir(DATA_DIR):
+        guild_ids.update(int(name) for name in os.listdir(DATA_DIR) if name.isdigit())
+    return [get_guild_data(guild_id) for guild_id in sorted(guild_ids)]
+
+# Top-level data files left by a single-server install - only PRIMARY_GUILD_ID reads them
+def legacy_data_files():
+    return [name for name in (GIVEAWAY_FILE, WALLET_FILE, DATABASE_FILE, WALLET_LEDGER_FILE) if os.path.exists(name)]
+
+if metrics:
+    metrics.gauge("giveaway_json_flush_pending", lambda: sum(
+        int(data.backend.giveaway_cache.dirty) for data in list(guild_data.values()) if isinstance(data.backend, JsonStorage)
+    ))
+
+# Get a user's wallet balance in a guild
+async def get_balance(guild_id, user_id):
+    return await get_guild_data(guild_id).wallets.balance(user_id)
 
 # Parse duration string (e.g., "1d", "7 days", "12h", "12 hours", "30m", "30 minutes")
 def parse_duration(duration_str):
@@ -134,352 +1365,1143 @@ def parse_duration(duration_str):
     
     return None
 
-async def get_user_entries(member):
+# Entry weights from each guild's role bonus table, memoized per member until their roles change
+class RoleWeights:
+    def __init__(self, bonuses_for):
+        self.bonuses_for = bonuses_for  # guild_id -> {role_id: bonus}
+        self.cache = {}  # (guild_id, member_id) -> entries
+
+    def weight(self, member):
+        key = (member.guild.id, member.id)
+        entries = self.cache.get(key)
+        if entries is None:
+            # Base entry plus each bonus role's extra entries (Member.get_role is a binary search)
+            bonuses = self.bonuses_for(member.guild.id)
+            entries = 1 + sum(bonus for role_id, bonus in bonuses.items() if member.get_role(role_id))
+            self.cache[key] = entries
+        return entries
+
+    def invalidate(self, guild_id, member_id):
+        self.cache.pop((guild_id, member_id), None)
+
+    def invalidate_guild(self, guild_id):
+        """Drop every cached weight in a guild (its bonus table changed)"""
+        self.cache = {key: entries for key, entries in self.cache.items() if key[0] != guild_id}
+
+role_weights = RoleWeights(lambda guild_id: get_guild_data(guild_id).config['role_bonuses'])
+
+def get_user_entries(member):
     """Calculate how many entries a user gets based on their roles"""
-    entries = 1  # Base entry
-    
-    # Check for booster role - gets 2 extra entries
-    if any(role.id == BOOSTER_ROLE_ID for role in member.roles):
-        entries += 2
-    
-    # Check for winners circle role - gets 3 extra entries
-    if any(role.id == WINNERS_CIRCLE_ROLE_ID for role in member.roles):
-        entries += 3
-    
-    return entries
+    return role_weights.weight(member)
 
-# Giveaway entry button with participants viewer
-class GiveawayButton(discord.ui.View):
-    def __init__(self, giveaway_id):
-        super().__init__(timeout=None)
-        self.giveaway_id = giveaway_id
+# Check if a member has their guild's support role
+def has_support_role(member):
+    role_id = get_guild_data(member.guild.id).config['support_role_id']
+    return role_id is not None and member.get_role(role_id) is not None
+
+# Bulk-request entrants missing from the member cache (and warm their weights) so draws run from memory
+async def prefetch_entrants(guild, entries):
+    missing = [user_id for user_id in entries if guild.get_member(user_id) is None]
+    if not missing:
+        return 0
+    
+    if len(missing) >= PREFETCH_CHUNK_GUILD_THRESHOLD and not guild.chunked:
+        # Cheaper to chunk the whole guild than to query thousands of IDs
+        members = await guild.chunk(cache=True)
+    else:
+        members = []
+        for start in range(0, len(missing), 100):  # Discord's limit per member request
+            try:
+                members += await guild.query_members(user_ids=missing[start:start + 100], cache=True)
+            except asyncio.TimeoutError:
+                print(f"Timed out prefetching members in guild {guild.id}")
     
-    @discord.ui.button(label="🎉 Enter Giveaway", style=discord.ButtonStyle.primary, custom_id="enter_giveaway")
-    async def enter_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        giveaways = load_giveaways()
-        giveaway = giveaways.get(self.giveaway_id)
+    for member in members:
+        get_user_entries(member)
+    return len(missing)
+
+# Resolve entrants to (member, entry weight) pairs, skipping anyone who has left the guild
+async def build_candidates(guild, entries):
+    await prefetch_entrants(guild, entries)
+    candidates = []
+    for user_id in entries:
+        member = guild.get_member(int(user_id))
+        if member:
+            candidates.append((member, get_user_entries(member)))
+    return candidates
+
+# Weighted sampling without replacement using exponential keys (Efraimidis-Spirakis)
+def weighted_sample(candidates, k, rng=random):
+    """Pick up to k distinct items from (item, weight) pairs in O(n + k log n), in draw order"""
+    keys = [(rng.expovariate(weight), i, item) for i, (item, weight) in enumerate(candidates) if weight > 0]
+    heapq.heapify(keys)
+    return [heapq.heappop(keys)[2] for _ in range(min(k, len(keys)))]
+
+# Draws a weighted pick rejects before a DrawPool falls back to a full pass over the entrants still eligible
+DRAW_POOL_MAX_TRIES = 32
+
+# Frozen snapshot of a giveaway's draw - eligible entrant IDs, their cumulative entry weights and everyone who has
+# won so far - so rerolls pick from the pool as it was at the end without re-resolving a single member
+class DrawPool:
+    def __init__(self, ids=(), cumulative=(), winners=()):
+        self.ids = array('Q', ids)
+        self.cumulative = array('Q', cumulative)
+        self.winners = list(winners)
+
+    @classmethod
+    def from_candidates(cls, candidates, winners=()):
+        """Snapshot (member, weight) pairs from build_candidates()"""
+        pool = cls(winners=winners)
+        total = 0
+        for member, weight in candidates:
+            if weight > 0:
+                total += weight
+                pool.ids.append(member.id)
+                pool.cumulative.append(total)
+        return pool
+
+    def __len__(self):
+        return len(self.ids)
+
+    def weight(self, i):
+        return self.cumulative[i] - (self.cumulative[i - 1] if i else 0)
+
+    def sample(self, exclude=(), rng=random):
+        """Pick one entrant ID not in exclude with weighted chances - O(log n) per try - or None if nobody is left"""
+        total = self.cumulative[-1] if self.cumulative else 0
+        if not total:
+            return None
+        for _ in range(DRAW_POOL_MAX_TRIES):
+            user_id = self.ids[bisect.bisect_right(self.cumulative, rng.randrange(total))]
+            if user_id not in exclude:
+                return user_id
+        
+        # Most of the weight has already won - draw from the rest directly
+        remaining = [(user_id, self.weight(i)) for i, user_id in enumerate(self.ids) if user_id not in exclude]
+        picked = weighted_sample(remaining, 1, rng)
+        return picked[0] if picked else None
+
+    def to_json(self):
+        return {'ids': encode_uint64s(self.ids), 'cumulative': encode_uint64s(self.cumulative), 'winners': self.winners}
+
+    @classmethod
+    def from_json(cls, value):
+        if isinstance(value, cls):
+            return value
+        pool = cls(winners=value['winners'])
+        pool.ids = decode_uint64s(value['ids'])
+        pool.cumulative = decode_uint64s(value['cumulative'])
+        return pool
+
+# Debounced editor for the "📊 Entries" field - at most one edit per giveaway per interval, always with the latest count
+class EntryCountUpdater:
+    def __init__(self, interval):
+        self.interval = interval
+        self.messages = {}   # giveaway_id -> cached giveaway message
+        self.pending = {}    # giveaway_id -> (giveaway, latest count)
+        self.tasks = {}      # giveaway_id -> running flush task
+        self.last_edit = {}  # giveaway_id -> loop time of the last edit
+
+    def remember(self, giveaway_id, message):
+        """Cache the giveaway message so the first update needs no fetch"""
+        self.messages[giveaway_id] = message
+
+    def update(self, giveaway_id, giveaway, count):
+        self.pending[giveaway_id] = (giveaway, count)
+        if giveaway_id not in self.tasks:
+            self.tasks[giveaway_id] = asyncio.create_task(self._run(giveaway_id))
+
+    def forget(self, giveaway_id):
+        """Drop pending updates and the cached message (giveaway ended)"""
+        task = self.tasks.pop(giveaway_id, None)
+        if task:
+            task.cancel()
+        self.pending.pop(giveaway_id, None)
+        self.messages.pop(giveaway_id, None)
+        self.last_edit.pop(giveaway_id, None)
+
+    async def _run(self, giveaway_id):
+        loop = asyncio.get_running_loop()
+        try:
+            while giveaway_id in self.pending:
+                wait = self.last_edit.get(giveaway_id, 0) + self.interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                giveaway, count = self.pending.pop(giveaway_id)
+                await self._edit(giveaway_id, giveaway, count)
+                self.last_edit[giveaway_id] = loop.time()
+        finally:
+            if self.tasks.get(giveaway_id) is asyncio.current_task():
+                del self.tasks[giveaway_id]
+
+    async def _edit(self, giveaway_id, giveaway, count):
+        try:
+            message = self.messages.get(giveaway_id)
+            if message is None:
+                channel = bot.get_channel(giveaway['channel_id'])
+                message = await channel.fetch_message(giveaway['message_id'])
+                self.messages[giveaway_id] = message
+            
+            embed = message.embeds[0]
+            for i, field in enumerate(embed.fields):
+                if field.name == "📊 Entries":
+                    embed.set_field_at(i, name="📊 Entries", value=str(count), inline=True)
+                    break
+            
+            self.messages[giveaway_id] = await message.edit(embed=embed)
+        except discord.NotFound:
+            self.messages.pop(giveaway_id, None)
+        except Exception as e:
+            print(f"Error updating entry count for giveaway {giveaway_id}: {e}")
+
+entry_count_updater = EntryCountUpdater(ENTRY_COUNT_UPDATE_INTERVAL)
+
+# Interaction acknowledgement guard - defers the interaction if the handler is still busy after ACK_DEFER_AFTER,
+# and sends replies as a followup once it has been deferred
+class AckBudget:
+    def __init__(self, interaction, ephemeral=True):
+        self.interaction = interaction
+        self.ephemeral = ephemeral
+        self.deferring = False
+        self.timer = None
+
+    async def __aenter__(self):
+        self.timer = asyncio.create_task(self._defer_later())
+        if self.interaction.guild is not None:
+            # Handlers then find the guild's partition open - a first-time open is covered by the defer timer
+            await open_guild_data(self.interaction.guild.id)
+        return self
+
+    async def __aexit__(self, *exc):
+        if not self.deferring:
+            self.timer.cancel()
+
+    async def _defer_later(self):
+        await asyncio.sleep(ACK_DEFER_AFTER)
+        if not self.interaction.response.is_done():
+            self.deferring = True
+            await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+
+    async def send(self, *args, **kwargs):
+        """Reply with send_message, or with a followup if the interaction was deferred"""
+        if self.deferring:
+            # Let an in-flight defer finish first
+            await self.timer
+        else:
+            self.timer.cancel()
+        if self.interaction.response.is_done():
+            await self.interaction.followup.send(*args, **kwargs)
+        else:
+            await self.interaction.response.send_message(*args, **kwargs)
+
+# Handle a click on a giveaway's enter button
+@instrumented("button enter")
+async def enter_giveaway(interaction, giveaway_id):
+    async with AckBudget(interaction) as ack:
+        storage = get_guild_data(interaction.guild.id).storage
+        giveaway = await storage.get_giveaway(giveaway_id)
         
         if not giveaway:
-            await interaction.response.send_message("❌ This giveaway no longer exists!", ephemeral=True)
+            await ack.send("❌ This giveaway no longer exists!", ephemeral=True)
             return
         
-        user_id = str(interaction.user.id)
-        
-        # Check if already entered
-        if user_id in giveaway['entries']:
-            await interaction.response.send_message("⚠️ You've already entered this giveaway!", ephemeral=True)
+        if giveaway['ended'] or giveaway.get('ending') or datetime.fromisoformat(giveaway['end_time']) <= datetime.utcnow():
+            await ack.send("❌ This giveaway has ended!", ephemeral=True)
             return
         
         # Check role requirements
         if giveaway['required_role_id']:
-            role = discord.utils.get(interaction.guild.roles, id=giveaway['required_role_id'])
-            if role and role not in interaction.user.roles:
-                await interaction.response.send_message(f"❌ You need the {role.mention} role to enter this giveaway!", ephemeral=True)
+            role = interaction.guild.get_role(giveaway['required_role_id'])
+            if role and interaction.user.get_role(role.id) is None:
+                await ack.send(f"❌ You need the {role.mention} role to enter this giveaway!", ephemeral=True)
                 return
         
-        # Add entry
-        giveaway['entries'].append(user_id)
-        save_giveaways(giveaways)
+        # Add entry (fails if already entered)
+        if not await storage.add_entry(giveaway_id, interaction.user.id):
+            await ack.send("⚠️ You've already entered this giveaway!", ephemeral=True)
+            return
         
         # Get user's entry count
         member = interaction.guild.get_member(interaction.user.id)
-        user_entries = await get_user_entries(member)
+        user_entries = get_user_entries(member)
         
         entry_msg = f"✅ You've successfully entered the giveaway!"
         if user_entries > 1:
             entry_msg += f"\n🎯 You have **{user_entries} entries** (role bonuses applied)!"
         entry_msg += "\nGood luck!"
         
-        await interaction.response.send_message(entry_msg, ephemeral=True)
+        await ack.send(entry_msg, ephemeral=True)
         
-        # Update the giveaway message with new entry count
-        try:
-            channel = bot.get_channel(giveaway['channel_id'])
-            message = await channel.fetch_message(giveaway['message_id'])
-            
-            embed = message.embeds[0]
-            # Update entries field
-            for i, field in enumerate(embed.fields):
-                if field.name == "📊 Entries":
-                    embed.set_field_at(i, name="📊 Entries", value=str(len(giveaway['entries'])), inline=True)
-                    break
-            
-            await message.edit(embed=embed)
-        except:
-            pass
-    
-    @discord.ui.button(label="👥 Participants", style=discord.ButtonStyle.secondary, custom_id="view_participants")
-    async def view_participants(self, interaction: discord.Interaction, button: discord.ui.Button):
-        giveaways = load_giveaways()
-        giveaway = giveaways.get(self.giveaway_id)
+        # Update the giveaway message with new entry count (debounced)
+        entry_count_updater.update(giveaway_id, giveaway, await storage.count_entries(giveaway_id))
+
+# Handle a click on a giveaway's participants button
+@instrumented("button participants")
+async def show_participants(interaction, giveaway_id):
+    async with AckBudget(interaction) as ack:
+        storage = get_guild_data(interaction.guild.id).storage
+        giveaway = await storage.get_giveaway(giveaway_id)
         
         if not giveaway:
-            await interaction.response.send_message("❌ This giveaway no longer exists!", ephemeral=True)
+            await ack.send("❌ This giveaway no longer exists!", ephemeral=True)
             return
         
-        if not giveaway['entries']:
-            await interaction.response.send_message("❌ No participants yet!", ephemeral=True)
+        count, pages = await participant_pages.get(storage, giveaway_id)
+        if not pages:
+            await ack.send("❌ No participants yet!", ephemeral=True)
             return
         
-        # Create participant list
-        participants = []
-        for user_id in giveaway['entries']:
-            participants.append(f"<@{user_id}>")
+        view = ParticipantsView(storage, giveaway_id, giveaway, count, pages)
+        await ack.send(embed=view.build_embed(), view=view, ephemeral=True)
+
+# Pre-rendered participant list pages per giveaway (LRU) - a new entry invalidates only the last page
+class ParticipantPageCache:
+    def __init__(self, page_size, max_giveaways):
+        self.page_size = page_size
+        self.max_giveaways = max_giveaways
+        self.cache = OrderedDict()  # giveaway_id -> (entry count, rendered pages)
+
+    async def get(self, storage, giveaway_id):
+        """Return (entry count, rendered pages)"""
+        count = await storage.count_entries(giveaway_id)
+        cached = self.cache.get(giveaway_id)
+        if cached and cached[0] == count:
+            self.cache.move_to_end(giveaway_id)
+            return cached
         
+        # Entries are append-only, so full pages rendered earlier are still valid
+        entries = await storage.get_entries(giveaway_id)
+        pages = cached[1][:cached[0] // self.page_size] if cached and cached[0] < len(entries) else []
+        ids = entries.ids
+        for start in range(len(pages) * self.page_size, len(ids), self.page_size):
+            pages.append("\n".join(
+                f"`{i}.` <@{user_id}>"
+                for i, user_id in enumerate(ids[start:start + self.page_size], start + 1)
+            ))
+        
+        self.cache[giveaway_id] = (len(ids), pages)
+        self.cache.move_to_end(giveaway_id)
+        while len(self.cache) > self.max_giveaways:
+            self.cache.popitem(last=False)
+        return len(ids), pages
+
+participant_pages = ParticipantPageCache(PARTICIPANTS_PER_PAGE, 64)
+
+# Ephemeral paginated participants list with prev/next, jump-to-page and user search
+class ParticipantsView(discord.ui.View):
+    def __init__(self, storage, giveaway_id, giveaway, total, pages):
+        super().__init__(timeout=300)
+        self.storage = storage
+        self.giveaway_id = giveaway_id
+        self.giveaway = giveaway
+        self.pages = pages
+        self.total = total
+        self.page = 0
+        self.update_buttons()
+
+    def build_embed(self):
         embed = discord.Embed(
-            title=f"👥 Giveaway Participants ({len(participants)})",
-            description="\n".join(participants),
+            title=f"👥 Giveaway Participants ({self.total})",
+            description=self.pages[self.page],
             color=discord.Color.blue()
         )
-        embed.set_footer(text=f"Prize: {giveaway['prize']}")
+        embed.set_footer(text=f"Prize: {self.giveaway['prize']} • Page {self.page + 1}/{len(self.pages)}")
+        return embed
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= len(self.pages) - 1
+
+    async def show(self, interaction, page):
+        self.page = max(0, min(page, len(self.pages) - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(label="🔢 Page", style=discord.ButtonStyle.secondary)
+    async def jump_to_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(JumpToPageModal(self))
+
+    @discord.ui.button(label="🔍 Find user", style=discord.ButtonStyle.secondary)
+    async def find_user(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(FindParticipantModal(self))
+
+# Modal asking which participants page to show
+class JumpToPageModal(discord.ui.Modal, title="Jump to page"):
+    page = discord.ui.TextInput(label="Page number", max_length=6)
+
+    def __init__(self, participants_view):
+        super().__init__()
+        self.participants_view = participants_view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        if not self.page.value.strip().isdigit():
+            await interaction.response.send_message("❌ Enter a page number!", ephemeral=True)
+            return
+        await self.participants_view.show(interaction, int(self.page.value) - 1)
+
+# Modal asking which user to find in the participants list
+class FindParticipantModal(discord.ui.Modal, title="Find participant"):
+    user = discord.ui.TextInput(label="User ID, mention or username", max_length=64)
+
+    def __init__(self, participants_view):
+        super().__init__()
+        self.participants_view = participants_view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        query = self.user.value.strip()
+        match = re.search(r'\d{15,20}', query)
+        if match:
+            user_id = int(match.group())
+        else:
+            member = interaction.guild.get_member_named(query.lstrip('@'))
+            user_id = member.id if member else None
+        
+        entries = await self.participants_view.storage.get_entries(self.participants_view.giveaway_id)
+        if user_id is None or user_id not in entries:
+            await interaction.response.send_message(f"❌ {query} hasn't entered this giveaway!", ephemeral=True)
+            return
         
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        position = entries.ids.index(user_id)
+        await self.participants_view.show(interaction, position // participant_pages.page_size)
+
+# Enter button - the giveaway ID lives in the custom_id, so one registered handler serves every giveaway
+class EnterGiveawayButton(discord.ui.DynamicItem[discord.ui.Button], template=r'giveaway:enter:(?P<giveaway_id>.+)'):
+    def __init__(self, giveaway_id):
+        super().__init__(discord.ui.Button(
+            label="🎉 Enter Giveaway",
+            style=discord.ButtonStyle.primary,
+            custom_id=f"giveaway:enter:{giveaway_id}"
+        ))
+        self.giveaway_id = giveaway_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['giveaway_id'])
+
+    async def callback(self, interaction: discord.Interaction):
+        await enter_giveaway(interaction, self.giveaway_id)
+
+# Participants button, routed the same way as EnterGiveawayButton
+class ParticipantsButton(discord.ui.DynamicItem[discord.ui.Button], template=r'giveaway:participants:(?P<giveaway_id>.+)'):
+    def __init__(self, giveaway_id):
+        super().__init__(discord.ui.Button(
+            label="👥 Participants",
+            style=discord.ButtonStyle.secondary,
+            custom_id=f"giveaway:participants:{giveaway_id}"
+        ))
+        self.giveaway_id = giveaway_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['giveaway_id'])
+
+    async def callback(self, interaction: discord.Interaction):
+        await show_participants(interaction, self.giveaway_id)
+
+# Giveaway entry button with participants viewer
+class GiveawayButton(discord.ui.View):
+    def __init__(self, giveaway_id):
+        super().__init__(timeout=None)
+        self.add_item(EnterGiveawayButton(giveaway_id))
+        self.add_item(ParticipantsButton(giveaway_id))
+
+# Buttons on giveaway messages posted before dynamic custom IDs - resolved from the clicked message's ID
+class LegacyGiveawayButton(discord.ui.View):
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    @discord.ui.button(label="🎉 Enter Giveaway", style=discord.ButtonStyle.primary, custom_id="enter_giveaway")
+    async def enter_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        giveaway_id, _ = await (await open_guild_data(interaction.guild.id)).storage.find_by_message(interaction.message.id)
+        await enter_giveaway(interaction, giveaway_id)
+
+    @discord.ui.button(label="👥 Participants", style=discord.ButtonStyle.secondary, custom_id="view_participants")
+    async def view_participants(self, interaction: discord.Interaction, button: discord.ui.Button):
+        giveaway_id, _ = await (await open_guild_data(interaction.guild.id)).storage.find_by_message(interaction.message.id)
+        await show_participants(interaction, giveaway_id)
+
+@bot.event
+async def setup_hook():
+    """Once per process, after login and before connecting to the gateway"""
+    # Register the giveaway button handlers (one per button type, not per giveaway)
+    bot.add_dynamic_items(EnterGiveawayButton, ParticipantsButton)
+    bot.add_view(LegacyGiveawayButton())
+    
+    # Start the metrics endpoint
+    if metrics:
+        await metrics.start()
+    await sync_command_tree()
 
 @bot.event
 async def on_ready():
-    # Add persistent view for giveaway buttons
-    giveaways = load_giveaways()
-    for giveaway_id in giveaways.keys():
-        bot.add_view(GiveawayButton(giveaway_id))
-    
-    # Start giveaway checker
-    check_giveaways.start()
+    # Runs again after every gateway reconnect - the starts are no-ops once running.
+    # Start giveaway scheduler, ending workers and archiver
+    scheduler.start()
+    ending_workers.start()
+    if not archive_giveaways.is_running():
+        archive_giveaways.start()
+    print(f"{bot.user} is now online!")
+
+# Fingerprint of the command definitions as Discord receives them, for this application
+def command_tree_hash():
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps([bot.application_id, payload], sort_keys=True).encode('utf-8')).hexdigest()
+
+# Sync the global command tree only if it changed since the last successful sync
+async def sync_command_tree():
+    tree_hash = command_tree_hash()
+    if os.path.exists(COMMAND_TREE_HASH_FILE):
+        with open(COMMAND_TREE_HASH_FILE, 'r') as f:
+            if f.read().strip() == tree_hash:
+                print("Command tree unchanged, skipping sync")
+                return
     
     try:
         synced = await bot.tree.sync()
         print(f"Synced {len(synced)} command(s)")
     except Exception as e:
         print(f"Failed to sync commands: {e}")
-    print(f"{bot.user} is now online!")
+        return
+    with open(COMMAND_TREE_HASH_FILE, 'w') as f:
+        f.write(tree_hash + "\n")
 
-# Background task to check for ended giveaways
-@tasks.loop(seconds=30)
-async def check_giveaways():
-    giveaways = load_giveaways()
-    current_time = datetime.utcnow()
-    
-    for giveaway_id, giveaway in list(giveaways.items()):
-        end_time = datetime.fromisoformat(giveaway['end_time'])
-        
-        if current_time >= end_time and not giveaway.get('ended', False):
-            await end_giveaway(giveaway_id, giveaway)
+@bot.event
+async def on_member_update(before, after):
+    # Recompute the member's entry weight next time if their roles changed
+    if before.roles != after.roles:
+        role_weights.invalidate(after.guild.id, after.id)
 
-async def end_giveaway(giveaway_id, giveaway):
-    """End a giveaway and pick winners with weighted entries"""
-    giveaways = load_giveaways()
-    
-    # Mark as ended
-    giveaway['ended'] = True
-    giveaways[giveaway_id] = giveaway
-    save_giveaways(giveaways)
-    
-    try:
-        channel = bot.get_channel(giveaway['channel_id'])
-        message = await channel.fetch_message(giveaway['message_id'])
-        guild = channel.guild
-        
-        # Pick winners
-        entries = giveaway['entries']
-        num_winners = giveaway['winners']
-        
-        if len(entries) == 0:
-            # No entries
-            embed = discord.Embed(
-                title="🎉 Giveaway Ended",
-                description=f"**Prize:** {giveaway['prize']}\n\n❌ No one entered this giveaway!",
-                color=discord.Color.red()
-            )
-            embed.set_thumbnail(url=THUMBNAIL_URL)
-            embed.set_image(url=BANNER_URL)
-            await message.edit(embed=embed, view=None)
-            await channel.send(f"The giveaway for **{giveaway['prize']}** has ended with no entries!")
-            return
+@bot.event
+async def on_member_remove(member):
+    role_weights.invalidate(member.guild.id, member.id)
+
+# Background task to move ended giveaways into the archive
+@tasks.loop(hours=1)
+async def archive_giveaways():
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_GRACE_DAYS)
+    for data in list(guild_data.values()):
+        giveaways = await data.storage.archivable_giveaways(cutoff)
+        if not giveaways:
+            continue
         
-        # Build weighted entry pool
-        entry_pool = []
-        valid_users = []
+        # Archive first so a crash in between leaves a duplicate, never a lost giveaway
+        await run_in_storage_thread(data.archive.append, giveaways)
+        await data.storage.remove_giveaways(list(giveaways))
+        print(f"Archived {len(giveaways)} ended giveaway(s) in guild {data.guild_id}")
+
+# Deadline scheduler - min-heap of (due time, giveaway_id, end_time, action), sleeps exactly until the next one is due.
+# Each giveaway gets a "prefetch" action PREFETCH_LEAD_MINUTES before its "end" action, which wakes the ending workers.
+class GiveawayScheduler:
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}  # giveaway_id -> scheduled end_time, heap entries not matching this are stale
+        self.guild_ids = {}  # giveaway_id -> guild_id of its data partition
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.running = set()
+
+    def _push(self, giveaway_id, end_time, now):
+        heapq.heappush(self.heap, (end_time, giveaway_id, end_time, 'end'))
+        prefetch_time = end_time - timedelta(minutes=PREFETCH_LEAD_MINUTES)
+        if prefetch_time > now:
+            heapq.heappush(self.heap, (prefetch_time, giveaway_id, end_time, 'prefetch'))
+
+    def schedule(self, guild_id, giveaway_id, end_time):
+        self.deadlines[giveaway_id] = end_time
+        self.guild_ids[giveaway_id] = guild_id
+        self._push(giveaway_id, end_time, datetime.utcnow())
+        self.wakeup.set()
+
+    def cancel(self, giveaway_id):
+        self.guild_ids.pop(giveaway_id, None)
+        if self.deadlines.pop(giveaway_id, None) is not None:
+            self.wakeup.set()
+
+    @staticmethod
+    def _active_deadlines():
+        """Open every partition and read its active giveaways - runs on the storage thread"""
+        deadlines = {}
+        for data in load_guild_data():
+            for giveaway_id, giveaway in data.backend.active_giveaways().items():
+                deadlines[giveaway_id] = (data.guild_id, datetime.fromisoformat(giveaway['end_time']))
+        return deadlines
+
+    async def load(self):
+        """Schedule the active giveaways in every guild partition"""
+        deadlines = await run_in_storage_thread(self._active_deadlines)
+        now = datetime.utcnow()
+        for giveaway_id, (guild_id, end_time) in deadlines.items():
+            # Giveaways scheduled while the partitions were being read are already up to date
+            if giveaway_id not in self.deadlines:
+                self.deadlines[giveaway_id] = end_time
+                self.guild_ids[giveaway_id] = guild_id
+                self._push(giveaway_id, end_time, now)
+        self.wakeup.set()
         
-        for user_id in entries:
-            try:
-                member = guild.get_member(int(user_id))
-                if not member:
-                    continue
-                
-                valid_users.append(member)
-                
-                # Add weighted entries based on roles
-                user_entries = await get_user_entries(member)
-                for _ in range(user_entries):
-                    entry_pool.append(member)
-            except:
+        # Every partition on disk is open now - deliver the logs spooled before a restart
+        for data in list(guild_data.values()):
+            log_digest.resume(data)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        await self.load()
+        while True:
+            # Skip entries that were cancelled or rescheduled
+            while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][2]:
+                heapq.heappop(self.heap)
+            self.wakeup.clear()
+            
+            if not self.heap:
+                await self.wakeup.wait()
                 continue
-        
-        if not entry_pool:
-            embed = discord.Embed(
-                title="🎉 Giveaway Ended",
-                description=f"**Prize:** {giveaway['prize']}\n\n❌ No valid entries!",
-                color=discord.Color.red()
-            )
-            embed.set_thumbnail(url=THUMBNAIL_URL)
-            embed.set_image(url=BANNER_URL)
-            await message.edit(embed=embed, view=None)
-            return
-        
-        # Select winners (with weighted chances)
-        num_to_pick = min(num_winners, len(valid_users))
-        winners = []
-        
-        for _ in range(num_to_pick):
-            if not entry_pool:
-                break
-            winner = random.choice(entry_pool)
-            if winner not in winners:
-                winners.append(winner)
-            # Remove all entries from this winner
-            entry_pool = [m for m in entry_pool if m.id != winner.id]
-        
-        gp_amount = giveaway['gp_amount']
-        gp_display = giveaway.get('gp_display', format_amount(gp_amount) + " GP")
-        
-        # Award GP to winners and give Winners Circle role
-        winners_circle_role = guild.get_role(WINNERS_CIRCLE_ROLE_ID)
-        booster_role = guild.get_role(BOOSTER_ROLE_ID)
-        winner_mentions = []
-        claim_deadline = datetime.utcnow() + timedelta(hours=24)
-        
-        # Get giveaway creation time
-        giveaway_created_time = datetime.fromisoformat(giveaway['end_time']) - (datetime.fromisoformat(giveaway['end_time']) - datetime.utcnow())
-        
-        for winner in winners:
-            winner_mentions.append(winner.mention)
             
-            # Check if winner has booster role
-            has_booster = booster_role in winner.roles
+            delay = (self.heap[0][0] - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
             
-            # Only add GP if gp_amount > 0 and winner has booster
-            if has_booster and gp_amount > 0:
-                # Award GP directly
-                current_balance = get_balance(winner.id)
-                new_balance = current_balance + gp_amount
-                set_balance(winner.id, new_balance)
+            _, giveaway_id, end_time, action = heapq.heappop(self.heap)
+            if action == 'prefetch':
+                task = asyncio.create_task(self._prefetch(get_guild_data(self.guild_ids[giveaway_id]), giveaway_id))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+            else:
+                del self.deadlines[giveaway_id]
+                del self.guild_ids[giveaway_id]
+                if metrics:
+                    metrics.observe("giveaway_end_lag_seconds", (), (datetime.utcnow() - end_time).total_seconds())
+                ending_workers.wake()
+
+    async def _prefetch(self, data, giveaway_id):
+        giveaway = await data.storage.get_giveaway(giveaway_id)
+        channel = bot.get_channel(giveaway['channel_id']) if giveaway else None
+        if channel:
+            fetched = await prefetch_entrants(channel.guild, await data.storage.get_entries(giveaway_id))
+            if fetched:
+                print(f"Prefetched {fetched} uncached entrant(s) for giveaway {giveaway_id}")
+
+scheduler = GiveawayScheduler()
+
+# Giveaway ending workers - each claims a due giveaway under a time-bounded lease in its guild's storage, so several
+# workers (or bot processes sharing the SQLite files) drain an ending backlog in parallel without double-drawing
+class EndingWorkers:
+    def __init__(self, count, lease_seconds, poll_seconds):
+        self.count = count
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.wakeup = asyncio.Event()
+        self.tasks = []
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._run(f"{self.owner}:{n}")) for n in range(self.count)]
+
+    def wake(self):
+        self.wakeup.set()
+
+    async def claim(self, data, giveaway_id):
+        """Lease one giveaway for this process (manual /giveaway end), returns the lease owner or None"""
+        now = datetime.utcnow()
+        if await data.storage.claim_giveaway(giveaway_id, self.owner, now, now + self.lease):
+            return self.owner
+        return None
+
+    async def _claim_due(self, worker_id):
+        now = datetime.utcnow()
+        for data in list(guild_data.values()):
+            claimed = await data.storage.claim_due_giveaway(worker_id, now, now + self.lease)
+            if claimed:
+                return data, *claimed
+        return None
+
+    async def _run(self, worker_id):
+        while True:
+            # Cleared before claiming so a wake-up during the claim isn't lost
+            self.wakeup.clear()
+            claimed = await self._claim_due(worker_id)
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    # Pick up partitions other processes have created since
+                    await run_in_storage_thread(load_guild_data)
+                continue
             
+            # There may be more due - let the next idle worker look
+            self.wakeup.set()
+            data, giveaway_id, giveaway = claimed
+            try:
+                await self.end(data, giveaway_id, giveaway, worker_id)
+            except Exception as e:
+                print(f"Error in ending worker {worker_id}: {e}")
+
+    async def end(self, data, giveaway_id, giveaway, owner):
+        """End a leased giveaway, renewing the lease until it's done - and stopping if the lease is lost"""
+        ending = asyncio.create_task(end_giveaway(data, giveaway_id, giveaway))
+        renewer = asyncio.create_task(self._renew(data, giveaway_id, owner, ending))
+        try:
+            await ending
+        except asyncio.CancelledError:
+            if not renewer.done():
+                raise
+            # Someone else holds the lease now and resumes from the journal - carrying on could draw twice
+            print(f"Stopped ending giveaway {giveaway_id}, its lease was lost")
+            return
+        except Exception as e:
+            await self._retry_later(data, giveaway_id, giveaway, owner, e)
+            return
+        finally:
+            renewer.cancel()
+        await data.storage.release_lease(giveaway_id, owner)
+
+    async def _retry_later(self, data, giveaway_id, giveaway, owner, error):
+        # The finished stages are already journaled - keep holding the lease until the back-off is over so no
+        # worker picks the giveaway up early, then whichever claims it resumes from the first unfinished stage
+        ending = giveaway['ending'] = dict(giveaway.get('ending', {}))
+        ending['attempts'] = ending.get('attempts', 0) + 1
+        ending['error'] = str(error)
+        if ending['attempts'] >= END_MAX_ATTEMPTS:
+            print(f"Giving up on ending giveaway {giveaway_id} after {ending['attempts']} attempts: {error}")
+            giveaway['ended'] = True
+            await data.storage.save_giveaway(giveaway_id, giveaway)
+            await data.storage.release_lease(giveaway_id, owner)
+            return
+        
+        delay = END_RETRY_BASE_SECONDS * 2 ** (ending['attempts'] - 1)
+        print(f"Error ending giveaway {giveaway_id} (attempt {ending['attempts']}), retrying in {delay}s: {error}")
+        await data.storage.save_giveaway(giveaway_id, giveaway)
+        await data.storage.renew_lease(giveaway_id, owner, datetime.utcnow() + timedelta(seconds=delay))
+
+    async def _renew(self, data, giveaway_id, owner, ending):
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            if not await data.storage.renew_lease(giveaway_id, owner, datetime.utcnow() + self.lease):
+                print(f"Lost the ending lease on giveaway {giveaway_id}")
+                ending.cancel()
+                return
+
+ending_workers = EndingWorkers(END_WORKERS, END_LEASE_SECONDS, END_POLL_SECONDS)
+
+if metrics:
+    metrics.gauge("giveaway_active_giveaways", lambda: len(scheduler.deadlines))
+    async def count_active_entries():
+        return sum([
+            await get_guild_data(guild_id).storage.count_entries(giveaway_id)
+            for giveaway_id, guild_id in list(scheduler.guild_ids.items())
+        ])
+    
+    metrics.gauge("giveaway_active_entries", count_active_entries)
+    metrics.gauge("process_io_read_bytes", lambda: read_process_io('read_bytes'))
+    metrics.gauge("process_io_write_bytes", lambda: read_process_io('write_bytes'))
+
+# Read a counter from /proc/self/io (Linux), includes SQLite I/O the storage counters can't see
+def read_process_io(field):
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+# Retry a Discord API call on transient failures (5xx, network errors, rate limits)
+async def with_retries(call, attempts=PAYOUT_RETRIES):
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except discord.RateLimited as e:
+            if attempt == attempts - 1:
+                raise
+            delay = e.retry_after
+        except discord.HTTPException as e:
+            if (e.status < 500 and e.status != 429) or attempt == attempts - 1:
+                raise
+            delay = 2 ** attempt
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == attempts - 1:
+                raise
+            delay = 2 ** attempt
+        await asyncio.sleep(delay)
+
+# Build the DM sent to a giveaway winner
+def build_winner_dm(giveaway, credited, claim_deadline, reroll=False, thumbnail_url=THUMBNAIL_URL):
+    gp_amount = giveaway['gp_amount']
+    gp_display = giveaway.get('gp_display', format_amount(gp_amount) + " GP")
+    won = f"You won the reroll for **{giveaway['prize']}**!" if reroll else f"You won **{giveaway['prize']}**!"
+    claim_notice = f"⚠️ **YOU MUST OPEN A TICKET WITHIN 24 HOURS OF THIS MESSAGE TO BE ABLE TO CLAIM. IF YOU DO NOT OPEN A CLAIM TICKET WITHIN THE ALLOTTED TIME YOUR PRIZE WILL BE FORFEITED.**\n\n⏰ Claim by: <t:{int(claim_deadline.timestamp())}:F>"
+    
+    dm_embed = discord.Embed(
+        title="🎉 Congratulations!",
+        color=discord.Color.gold()
+    )
+    
+    if credited:
+        dm_embed.description = f"{won}\n\n💰 **{gp_display}** has been added to your wallet!\n🏆 You've been given the Winners Circle role!"
+    elif gp_amount > 0:
+        dm_embed.description = f"{won}\n\n💰 **Prize:** {gp_display}\n🏆 You've been given the Winners Circle role!\n\n{claim_notice}"
+    else:
+        # No GP prize (e.g., "bond")
+        dm_embed.description = f"{won}\n\n🎁 **Prize:** {gp_display}\n🏆 You've been given the Winners Circle role!\n\n{claim_notice}"
+    
+    dm_embed.set_thumbnail(url=thumbnail_url)
+    return dm_embed
+
+# Credit the boosters among the winners in one ledger write, returns the set of credited user IDs.
+# With resume=True (an interrupted ending) winners the ledger already shows as paid aren't paid again.
+async def credit_winners(data, winners, giveaway_id, giveaway, reason, actor_id=None, resume=False):
+    booster_role_id = data.config['booster_role_id']
+    gp_amount = giveaway['gp_amount']
+    
+    # Only add GP if gp_amount > 0 and winner has booster
+    eligible = [winner for winner in winners if gp_amount > 0 and booster_role_id and winner.get_role(booster_role_id)]
+    paid = await data.storage.giveaway_credits(giveaway_id, reason) if resume else set()
+    unpaid = [winner for winner in eligible if winner.id not in paid]
+    if unpaid:
+        await data.wallets.commit([
+            wallet_transaction(winner.id, gp_amount, reason, giveaway_id=giveaway_id, actor_id=actor_id)
+            for winner in unpaid
+        ])
+    return {winner.id for winner in eligible}
+
+# Grant the Winners Circle role and DM each winner with bounded parallelism
+async def notify_winners(winners, giveaway, guild, config, credited, claim_deadline, reroll=False):
+    """Returns one result per winner: {'user_id', 'credited', 'role_ok', 'dm_ok'}"""
+    semaphore = asyncio.Semaphore(PAYOUT_CONCURRENCY)
+    winners_circle_role = guild.get_role(config['winners_circle_role_id']) if config['winners_circle_role_id'] else None
+    
+    async def notify(winner):
+        result = {'user_id': winner.id, 'credited': winner.id in credited, 'role_ok': False, 'dm_ok': False}
+        
+        async with semaphore:
             # Give Winners Circle role
-            if winners_circle_role and winners_circle_role not in winner.roles:
+            if winners_circle_role is None or winner.get_role(winners_circle_role.id):
+                result['role_ok'] = winners_circle_role is not None
+            else:
                 try:
-                    await winner.add_roles(winners_circle_role)
-                except:
-                    pass
+                    await with_retries(lambda: winner.add_roles(winners_circle_role))
+                    result['role_ok'] = True
+                except Exception as e:
+                    print(f"Error giving Winners Circle role to {winner.id}: {e}")
             
             # DM winner
             try:
-                dm_embed = discord.Embed(
-                    title="🎉 Congratulations!",
-                    color=discord.Color.gold()
-                )
-                
-                if has_booster and gp_amount > 0:
-                    dm_embed.description = f"You won **{giveaway['prize']}**!\n\n💰 **{gp_display}** has been added to your wallet!\n🏆 You've been given the Winners Circle role!"
-                elif gp_amount > 0:
-                    dm_embed.description = f"You won **{giveaway['prize']}**!\n\n💰 **Prize:** {gp_display}\n🏆 You've been given the Winners Circle role!\n\n⚠️ **YOU MUST OPEN A TICKET WITHIN 24 HOURS OF THIS MESSAGE TO BE ABLE TO CLAIM. IF YOU DO NOT OPEN A CLAIM TICKET WITHIN THE ALLOTTED TIME YOUR PRIZE WILL BE FORFEITED.**\n\n⏰ Claim by: <t:{int(claim_deadline.timestamp())}:F>"
-                else:
-                    # No GP prize (e.g., "bond")
-                    dm_embed.description = f"You won **{giveaway['prize']}**!\n\n🎁 **Prize:** {gp_display}\n🏆 You've been given the Winners Circle role!\n\n⚠️ **YOU MUST OPEN A TICKET WITHIN 24 HOURS OF THIS MESSAGE TO BE ABLE TO CLAIM. IF YOU DO NOT OPEN A CLAIM TICKET WITHIN THE ALLOTTED TIME YOUR PRIZE WILL BE FORFEITED.**\n\n⏰ Claim by: <t:{int(claim_deadline.timestamp())}:F>"
-                
-                dm_embed.set_thumbnail(url=THUMBNAIL_URL)
-                await winner.send(embed=dm_embed)
-            except:
-                pass
+                dm_embed = build_winner_dm(giveaway, result['credited'], claim_deadline, reroll, config['thumbnail_url'])
+                await with_retries(lambda: winner.send(embed=dm_embed))
+                result['dm_ok'] = True
+            except Exception as e:
+                print(f"Error sending winner DM to {winner.id}: {e}")
         
-        # Announce winners
-        winner_list = "\n".join(winner_mentions)
+        return result
+    
+    return await asyncio.gather(*(notify(winner) for winner in winners))
+
+# Format one payout result line for the log embeds
+def format_payout_result(result):
+    if result['credited']:
+        status = "✅ Auto-claimed"
+    else:
+        status = "⏳ Must claim"
+    role = "✅" if result['role_ok'] else "❌"
+    dm = "✅" if result['dm_ok'] else "❌"
+    return f"<@{result['user_id']}> ({status}) · Role {role} · DM {dm}"
+
+# Winners still in the guild, from their stored IDs
+async def resolve_winners(guild, user_ids):
+    winners = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                continue
+        winners.append(member)
+    return winners
+
+# Stages of ending a giveaway, in order. Each one is journaled in giveaway['ending'] when done, so an ending
+# interrupted by a crash or restart resumes at the first unfinished stage instead of redrawing or repaying.
+END_STAGES = ('closed', 'drawn', 'credited', 'roles', 'announced', 'logged')
+
+async def end_giveaway(data, giveaway_id, giveaway):
+    """End (or resume ending) a giveaway in a guild's partition and pick winners with weighted entries - raises if a stage fails"""
+    storage = data.storage
+    config = data.config
+    scheduler.cancel(giveaway_id)
+    
+    # A private copy - the stored record's journal may be mid-write on the storage thread
+    ending = giveaway['ending'] = dict(giveaway.get('ending', {}))
+    
+    def done(stage):
+        return ending.get('stage') is not None and END_STAGES.index(ending['stage']) >= END_STAGES.index(stage)
+    
+    resuming = done('drawn')
+    
+    async def finish(stage):
+        # Durable before the next stage starts - with the JSON backend a merely cached journal could be lost
+        # in a crash after the payout, and the giveaway would be drawn and paid out again
+        ending['stage'] = stage
+        await storage.save_giveaway(giveaway_id, giveaway)
+        await storage.flush()
+    
+    # Close entries before reading them - the draw can wait on member fetches, and a click meanwhile must be
+    # refused rather than stored and never drawn. Ended early by hand, it's due now, so if this attempt fails
+    # the workers' due-claims retry it
+    if not done('closed'):
+        now = datetime.utcnow()
+        if datetime.fromisoformat(giveaway['end_time']) > now:
+            giveaway['end_time'] = now.isoformat()
+        await finish('closed')
+    
+    # Only once closed, so no click can queue another count edit over the ended embed
+    entry_count_updater.forget(giveaway_id)
+    
+    guild = bot.get_guild(data.guild_id)
+    if guild is None:
+        raise RuntimeError(f"Guild {data.guild_id} is not available")
+    
+    gp_amount = giveaway['gp_amount']
+    gp_display = giveaway.get('gp_display', format_amount(gp_amount) + " GP")
+    
+    # Pick winners (with weighted chances) from the entrants still in the guild
+    if not done('drawn'):
+        entries = await storage.get_entries(giveaway_id)
+        candidates = await build_candidates(guild, entries) if len(entries) else []
+        if metrics and candidates:
+            metrics.observe("giveaway_draw_pool_size", (), len(candidates))
+        winners = weighted_sample(candidates, min(giveaway['winners'], len(candidates)))
         
+        ending['entry_count'] = len(entries)
+        ending['winners'] = [winner.id for winner in winners]
+        giveaway['draw'] = DrawPool.from_candidates(candidates, ending['winners'])
+        ending['claim_deadline'] = (datetime.utcnow() + timedelta(hours=24)).isoformat()
+        await finish('drawn')
+    
+    winner_ids = ending['winners']
+    winners = await resolve_winners(guild, winner_ids) if winner_ids else []
+    claim_deadline = datetime.fromisoformat(ending['claim_deadline'])
+    
+    # Award GP - all winners in one ledger write
+    if not done('credited'):
+        ending['credited'] = sorted(await credit_winners(data, winners, giveaway_id, giveaway, "giveaway_win", resume=resuming))
+        await finish('credited')
+    
+    # Give Winners Circle role and DM winners
+    if not done('roles'):
+        ending['results'] = await notify_winners(winners, giveaway, guild, config, set(ending['credited']), claim_deadline)
+        await finish('roles')
+    
+    if not done('announced'):
+        await announce_giveaway_end(giveaway, config, winner_ids, gp_display)
+        await finish('announced')
+    
+    # Log to giveaway log channel
+    if not done('logged') and winner_ids and config['log_channel_id']:
+        await log_digest.post(data, build_end_log_embed(giveaway_id, giveaway, config, guild, gp_display, ending['results'], claim_deadline))
+    
+    giveaway['ended'] = True
+    await finish('logged')
+
+# Replace the giveaway embed with the result and announce the winners in its channel
+async def announce_giveaway_end(giveaway, config, winner_ids, gp_display):
+    channel = bot.get_channel(giveaway['channel_id'])
+    try:
+        message = await channel.fetch_message(giveaway['message_id']) if channel else None
+    except discord.NotFound:
+        message = None
+    if message is None:
+        print(f"Giveaway message {giveaway['message_id']} is gone, skipping the announcement")
+        return
+    
+    if not winner_ids:
+        no_entries = giveaway['ending']['entry_count'] == 0
         embed = discord.Embed(
-            title="🎉 Giveaway Ended! 🎉",
-            description=f"**Prize:** {giveaway['prize']}\n**GP Reward:** {gp_display}\n\n{'**Winner:**' if num_to_pick == 1 else '**Winners:**'}\n{winner_list}",
-            color=discord.Color.gold()
+            title="🎉 Giveaway Ended",
+            description=f"**Prize:** {giveaway['prize']}\n\n❌ {'No one entered this giveaway!' if no_entries else 'No valid entries!'}",
+            color=discord.Color.red()
         )
-        embed.set_thumbnail(url=THUMBNAIL_URL)
-        embed.set_image(url=BANNER_URL)
+        embed.set_thumbnail(url=config['thumbnail_url'])
+        embed.set_image(url=config['banner_url'])
         await message.edit(embed=embed, view=None)
-        
-        announcement = f"🎉 **Giveaway Ended!**\n\n{'Winner' if num_to_pick == 1 else 'Winners'}: {winner_list}\n**Prize:** {giveaway['prize']}\n**Reward:** {gp_display}"
-        if num_to_pick > 1 and gp_amount > 0:
-            announcement += " each"
-        await channel.send(announcement)
-        
-        # Log to giveaway log channel
+        if no_entries:
+            await channel.send(f"The giveaway for **{giveaway['prize']}** has ended with no entries!")
+        return
+    
+    # Announce winners
+    winner_list = "\n".join(f"<@{user_id}>" for user_id in winner_ids)
+    single = len(winner_ids) == 1
+    
+    embed = discord.Embed(
+        title="🎉 Giveaway Ended! 🎉",
+        description=f"**Prize:** {giveaway['prize']}\n**GP Reward:** {gp_display}\n\n{'**Winner:**' if single else '**Winners:**'}\n{winner_list}",
+        color=discord.Color.gold()
+    )
+    embed.set_thumbnail(url=config['thumbnail_url'])
+    embed.set_image(url=config['banner_url'])
+    await message.edit(embed=embed, view=None)
+    
+    announcement = f"🎉 **Giveaway Ended!**\n\n{'Winner' if single else 'Winners'}: {winner_list}\n**Prize:** {giveaway['prize']}\n**Reward:** {gp_display}"
+    if not single and giveaway['gp_amount'] > 0:
+        announcement += " each"
+    await channel.send(announcement)
+
+# Build the winner log embed for an ended giveaway
+def build_end_log_embed(giveaway_id, giveaway, config, guild, gp_display, results, claim_deadline):
+    host = guild.get_member(giveaway['host_id'])
+    host_mention = host.mention if host else f"<@{giveaway['host_id']}>"
+    
+    # Create log embed
+    log_embed = discord.Embed(
+        title="📋 Giveaway Winner Log",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    
+    log_embed.add_field(
+        name="🎁 Giveaway Details",
+        value=f"**Prize:** {giveaway['prize']}\n**Reward:** {gp_display}\n**Created by:** {host_mention}\n**Created at:** <t:{int(datetime.fromisoformat(giveaway['end_time']).timestamp())}:F>",
+        inline=False
+    )
+    
+    # Add winner info with claim deadline
+    winner_info = ""
+    for i, result in enumerate(results, 1):
+        winner_info += f"**Winner {i}:** {format_payout_result(result)}\n"
+    
+    winner_info += f"\n**Won at:** <t:{int(datetime.utcnow().timestamp())}:F>\n"
+    winner_info += f"**Claim deadline:** <t:{int(claim_deadline.timestamp())}:R>"
+    
+    log_embed.add_field(
+        name="🏆 Winners",
+        value=winner_info,
+        inline=False
+    )
+    
+    log_embed.set_thumbnail(url=config['thumbnail_url'])
+    log_embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+    return log_embed
+
+# Split log embeds into messages within Discord's per-message embed and character limits
+def pack_log_embeds(embeds):
+    batch, size = [], 0
+    for embed in embeds:
+        if batch and (len(batch) == LOG_EMBEDS_PER_MESSAGE or size + len(embed) > LOG_CHARS_PER_MESSAGE):
+            yield batch
+            batch, size = [], 0
+        batch.append(embed)
+        size += len(embed)
+    if batch:
+        yield batch
+
+# Batched writer for each guild's log channel. Every embed is written to the guild's on-disk spool before post()
+# returns; the spool goes out as digest messages once a message's worth is waiting or LOG_FLUSH_SECONDS after the
+# first, and whatever the channel can't take stays spooled and is retried until it goes out
+class LogDigest:
+    def __init__(self, flush_seconds):
+        self.flush_seconds = flush_seconds
+        self.pending = {}   # guild_id -> (embeds, characters) posted since the last flush started
+        self.full = {}      # guild_id -> set once a whole message's worth is waiting
+        self.tasks = {}     # guild_id -> running flush task
+
+    async def post(self, data, embed):
+        await run_in_storage_thread(data.log_spool.append, [embed.to_dict()])
+        count, chars = self.pending.get(data.guild_id, (0, 0))
+        count, chars = self.pending[data.guild_id] = (count + 1, chars + len(embed))
+        self._start(data)
+        if count >= LOG_EMBEDS_PER_MESSAGE or chars >= LOG_CHARS_PER_MESSAGE:
+            self.full[data.guild_id].set()
+
+    def resume(self, data):
+        """Deliver whatever a partition has spooled (e.g. from before a restart)"""
+        self._start(data)
+
+    def _start(self, data):
+        if data.guild_id not in self.tasks:
+            self.full[data.guild_id] = asyncio.Event()
+            self.tasks[data.guild_id] = asyncio.create_task(self._run(data))
+
+    async def _run(self, data):
+        guild_id = data.guild_id
+        delay = self.flush_seconds
         try:
-            log_channel = bot.get_channel(GIVEAWAY_LOG_CHANNEL_ID)
-            if log_channel:
-                host = guild.get_member(giveaway['host_id'])
-                host_mention = host.mention if host else f"<@{giveaway['host_id']}>"
-                
-                # Create log embed
-                log_embed = discord.Embed(
-                    title="📋 Giveaway Winner Log",
-                    color=discord.Color.blue(),
-                    timestamp=datetime.utcnow()
-                )
-                
-                log_embed.add_field(
-                    name="🎁 Giveaway Details",
-                    value=f"**Prize:** {giveaway['prize']}\n**Reward:** {gp_display}\n**Created by:** {host_mention}\n**Created at:** <t:{int(datetime.fromisoformat(giveaway['end_time']).timestamp())}:F>",
-                    inline=False
-                )
-                
-                # Add winner info with claim deadline
-                winner_info = ""
-                for i, winner in enumerate(winners, 1):
-                    has_booster = booster_role in winner.roles
-                    if gp_amount > 0:
-                        status = "✅ Auto-claimed" if has_booster else "⏳ Must claim"
-                    else:
-                        status = "⏳ Must claim"
-                    winner_info += f"**Winner {i}:** {winner.mention} ({status})\n"
-                
-                winner_info += f"\n**Won at:** <t:{int(datetime.utcnow().timestamp())}:F>\n"
-                winner_info += f"**Claim deadline:** <t:{int(claim_deadline.timestamp())}:R>"
-                
-                log_embed.add_field(
-                    name="🏆 Winners",
-                    value=winner_info,
-                    inline=False
-                )
-                
-                log_embed.set_thumbnail(url=THUMBNAIL_URL)
-                log_embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
-                
-                await log_channel.send(embed=log_embed)
-        except Exception as e:
-            print(f"Error logging giveaway: {e}")
+            while True:
+                try:
+                    await asyncio.wait_for(self.full[guild_id].wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.full[guild_id].clear()
+                self.pending.pop(guild_id, None)
+                try:
+                    delivered = await self._flush(data)
+                except Exception as e:
+                    print(f"Error flushing giveaway logs for guild {guild_id}: {e}")
+                    delivered = False
+                if delivered:
+                    delay = self.flush_seconds
+                    if guild_id not in self.pending:
+                        return
+                else:
+                    # Nothing is lost - keep retrying the spool, backing off, until it's delivered
+                    delay = min(max(delay, 1) * 2, LOG_RETRY_MAX_SECONDS)
+        finally:
+            del self.tasks[guild_id]
+
+    async def _flush(self, data):
+        """Send the spooled embeds, returns whether all of them were delivered"""
+        spooled = await run_in_storage_thread(data.log_spool.read)
+        if not spooled:
+            return True
+        queue = [discord.Embed.from_dict(embed) for embed in spooled]
+        
+        channel_id = data.config['log_channel_id']
+        channel = bot.get_channel(channel_id) if channel_id else None
+        sent = 0
+        if channel is None:
+            print(f"Giveaway log channel {channel_id} is unavailable, keeping {len(queue)} log(s) spooled")
+        else:
+            for batch in pack_log_embeds(queue):
+                try:
+                    await with_retries(lambda: channel.send(embeds=batch))
+                except Exception as e:
+                    print(f"Error sending giveaway logs to {channel_id}, keeping {len(queue) - sent} log(s) spooled: {e}")
+                    break
+                sent += len(batch)
         
-    except Exception as e:
-        print(f"Error ending giveaway {giveaway_id}: {e}")
+        if sent:
+            await run_in_storage_thread(data.log_spool.discard, sent)
+        return sent == len(queue)
 
-# Giveaway commands
-giveaway_group = app_commands.Group(name="giveaway", description="Giveaway commands")
+log_digest = LogDigest(LOG_FLUSH_SECONDS)
 
-@giveaway_group.command(name="create", description="Create a new giveaway (Support only)")
-@app_commands.describe(
-    prize="What are you giving away?",
-    gp_amount="GP reward amount (e.g., 20m, 500k, 1000) or text like 'bond' - use 0 for no GP",
-    duration="Duration (e.g., 7d, 7 days, 12h, 12 hours, 30m, 30 minutes)",
-    winners="Number of winners (default: 1)",
-    required_role="Role required to enter (optional)"
-)
-async def giveaway_create(
-    interaction: discord.Interaction,
-    prize: str,
-    gp_amount: str,
-    duration: str,
-    winners: int = 1,
-    required_role: discord.Role = None
-):
-    # Check if user has support role
-    support_role = discord.utils.get(interaction.guild.roles, id=SUPPORT_ROLE_ID)
-    if support_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the @support role to use this command!", ephemeral=True)
-        return
+# Look up a giveaway in a guild's partition from a message ID typed into a command, optionally falling back to the archive
+async def find_giveaway_by_message(data, message_id, include_archive=False):
+    message_id = message_id.strip()
+    if not message_id.isdigit():
+        return None, None
+    giveaway_id, giveaway = await data.storage.find_by_message(int(message_id))
+    if giveaway is None and include_archive:
+        giveaway_id, giveaway = await run_in_storage_thread(data.archive.find_by_message, int(message_id))
+    return giveaway_id, giveaway
+
+# Validate giveaway options - returns (spec, None), or (None, error message)
+def parse_giveaway_spec(prize, gp_amount, duration, winners):
+    if not prize:
+        return None, "A prize is required!"
     
     # Parse GP amount (allow text for non-GP prizes like "bond")
     parsed_gp = parse_amount(gp_amount)
@@ -489,212 +2511,319 @@ async def giveaway_create(
         gp_display = gp_amount
     else:
         if parsed_gp < 0:
-            await interaction.response.send_message("❌ GP amount cannot be negative!", ephemeral=True)
-            return
+            return None, "GP amount cannot be negative!"
         gp_display = format_amount(parsed_gp) + " GP"
     
     # Parse duration
     duration_delta = parse_duration(duration)
     if duration_delta is None:
-        await interaction.response.send_message("❌ Invalid duration! Use formats like: 7d, 7 days, 12h, 12 hours, 30m, 30 minutes (max 60 days)", ephemeral=True)
-        return
+        return None, "Invalid duration! Use formats like: 7d, 7 days, 12h, 12 hours, 30m, 30 minutes (max 60 days)"
     
     # Validate winners
     if winners < 1:
-        await interaction.response.send_message("❌ Must have at least 1 winner!", ephemeral=True)
-        return
+        return None, "Must have at least 1 winner!"
     
-    end_time = datetime.utcnow() + duration_delta
-    giveaway_id = f"{interaction.channel.id}_{int(datetime.utcnow().timestamp())}"
+    return {'prize': prize, 'gp_amount': parsed_gp, 'gp_display': gp_display, 'duration': duration_delta, 'winners': winners}, None
+
+# Find a role from a mention, ID or name
+def find_role(guild, value):
+    match = re.search(r'\d{15,20}', value)
+    if match:
+        return guild.get_role(int(match.group()))
+    return discord.utils.get(guild.roles, name=value.lstrip('@'))
+
+# Build the embed for a new giveaway message
+def build_giveaway_embed(config, spec, end_time, required_role, host):
+    winners = spec['winners']
     
     # Create giveaway embed with enhanced formatting
     embed = discord.Embed(
-        title=f"🎉 {prize}",
+        title=f"🎉 {spec['prize']}",
         color=discord.Color.purple()
     )
     
     description = f"Click 🎉 button to enter!\n"
     description += f"**Winners:** {winners}\n"
-    description += f"**GP Reward:** {gp_display}"
-    if winners > 1 and parsed_gp > 0:
+    description += f"**GP Reward:** {spec['gp_display']}"
+    if winners > 1 and spec['gp_amount'] > 0:
         description += " each"
     description += "\n\n"
     
     # Add extra entries info
-    description += "**Extra Entries:**\n"
-    description += f"<@&{WINNERS_CIRCLE_ROLE_ID}>: **2 extra entries**\n"
-    description += f"<@&{BOOSTER_ROLE_ID}>: **3 extra entries**\n\n"
+    if config['role_bonuses']:
+        description += "**Extra Entries:**\n"
+        for role_id, bonus in config['role_bonuses'].items():
+            description += f"<@&{role_id}>: **{bonus} extra entries**\n"
+        description += "\n"
     
     if required_role:
         description += f"**Required Role:** {required_role.mention}\n\n"
     
-    description += f"**Winner will get:** <@&{WINNERS_CIRCLE_ROLE_ID}> role"
+    if config['winners_circle_role_id']:
+        description += f"**Winner will get:** <@&{config['winners_circle_role_id']}> role"
     
     embed.description = description
-    embed.set_footer(text=f"Hosted by: @{interaction.user.display_name}")
+    embed.set_footer(text=f"Hosted by: @{host.display_name}")
     embed.timestamp = end_time
-    embed.set_thumbnail(url=THUMBNAIL_URL)
-    embed.set_image(url=BANNER_URL)
+    embed.set_thumbnail(url=config['thumbnail_url'])
+    embed.set_image(url=config['banner_url'])
     
     embed.add_field(name="⏰ Ends", value=f"<t:{int(end_time.timestamp())}:R>", inline=True)
     embed.add_field(name="📊 Entries", value="0", inline=True)
-    
-    await interaction.response.send_message("✅ Creating giveaway...", ephemeral=True)
-    
-    view = GiveawayButton(giveaway_id)
-    message = await interaction.channel.send(embed=embed, view=view)
-    
-    # Save giveaway data
-    giveaways = load_giveaways()
-    giveaways[giveaway_id] = {
-        'prize': prize,
-        'gp_amount': parsed_gp,
-        'gp_display': gp_display,
-        'winners': winners,
-        'entries': [],
-        'channel_id': interaction.channel.id,
+    return embed
+
+# Stored record for a newly posted giveaway
+def new_giveaway_record(spec, message, host, end_time, required_role):
+    return {
+        'prize': spec['prize'],
+        'gp_amount': spec['gp_amount'],
+        'gp_display': spec['gp_display'],
+        'winners': spec['winners'],
+        'guild_id': message.guild.id,
+        'channel_id': message.channel.id,
         'message_id': message.id,
-        'host_id': interaction.user.id,
+        'host_id': host.id,
         'end_time': end_time.isoformat(),
         'required_role_id': required_role.id if required_role else None,
         'ended': False
     }
-    save_giveaways(giveaways)
-    
-    await interaction.followup.send(f"✅ Giveaway created! Ends <t:{int(end_time.timestamp())}:R>", ephemeral=True)
+
+# Giveaway commands
+giveaway_group = app_commands.Group(name="giveaway", description="Giveaway commands", guild_only=True)
+
+@giveaway_group.command(name="create", description="Create a new giveaway (Support only)")
+@app_commands.describe(
+    prize="What are you giving away?",
+    gp_amount="GP reward amount (e.g., 20m, 500k, 1000) or text like 'bond' - use 0 for no GP",
+    duration="Duration (e.g., 7d, 7 days, 12h, 12 hours, 30m, 30 minutes)",
+    winners="Number of winners (default: 1)",
+    required_role="Role required to enter (optional)"
+)
+@instrumented("giveaway create")
+async def giveaway_create(
+    interaction: discord.Interaction,
+    prize: str,
+    gp_amount: str,
+    duration: str,
+    winners: int = 1,
+    required_role: discord.Role = None
+):
+    async with AckBudget(interaction) as ack:
+        data = get_guild_data(interaction.guild.id)
+        config = data.config
+        
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        spec, error = parse_giveaway_spec(prize, gp_amount, duration, winners)
+        if error:
+            await ack.send(f"❌ {error}", ephemeral=True)
+            return
+        
+        end_time = datetime.utcnow() + spec['duration']
+        giveaway_id = f"{interaction.channel.id}_{int(datetime.utcnow().timestamp())}"
+        embed = build_giveaway_embed(config, spec, end_time, required_role, interaction.user)
+        
+        await ack.send("✅ Creating giveaway...", ephemeral=True)
+        
+        view = GiveawayButton(giveaway_id)
+        message = await interaction.channel.send(embed=embed, view=view)
+        entry_count_updater.remember(giveaway_id, message)
+        
+        # Save giveaway data
+        await data.storage.save_giveaway(giveaway_id, new_giveaway_record(spec, message, interaction.user, end_time, required_role))
+        scheduler.schedule(interaction.guild.id, giveaway_id, end_time)
+        
+        await ack.send(f"✅ Giveaway created! Ends <t:{int(end_time.timestamp())}:R>", ephemeral=True)
+
+@giveaway_group.command(name="create-batch", description="Create many giveaways at once from a CSV file (Support only)")
+@app_commands.describe(
+    file="CSV with a header row: prize, gp_amount, duration, winners (optional), required_role (optional name, ID or mention)"
+)
+@instrumented("giveaway create-batch")
+async def giveaway_create_batch(interaction: discord.Interaction, file: discord.Attachment):
+    async with AckBudget(interaction) as ack:
+        data = get_guild_data(interaction.guild.id)
+        
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        try:
+            rows = list(csv.DictReader(io.StringIO((await file.read()).decode('utf-8-sig'))))
+        except (discord.HTTPException, UnicodeDecodeError, csv.Error) as e:
+            await ack.send(f"❌ Couldn't read the file: {e}", ephemeral=True)
+            return
+        
+        if not rows:
+            await ack.send("❌ The file has no giveaways! Put a header row first: prize,gp_amount,duration,winners,required_role", ephemeral=True)
+            return
+        
+        if len(rows) > BATCH_MAX_GIVEAWAYS:
+            await ack.send(f"❌ Too many giveaways! The limit is {BATCH_MAX_GIVEAWAYS} per file.", ephemeral=True)
+            return
+        
+        # Validate every row, bad rows are reported and skipped (line 1 is the header)
+        results = {}  # line -> report line
+        valid = []
+        for line, row in enumerate(rows, 2):
+            row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+            prize = row.get('prize', "")
+            winners = row.get('winners') or "1"
+            spec, error = parse_giveaway_spec(prize, row.get('gp_amount', ""), row.get('duration', ""), int(winners) if winners.isdigit() else 0)
+            
+            required_role = None
+            if not error and row.get('required_role'):
+                required_role = find_role(interaction.guild, row['required_role'])
+                if required_role is None:
+                    error = f"Role {row['required_role']} not found!"
+            
+            if error:
+                results[line] = f"❌ Line {line} ({prize or 'no prize'}): {error}"
+            else:
+                valid.append((line, spec, required_role))
+        
+        await ack.send(f"⏳ Posting {len(valid)} giveaway(s)...", ephemeral=True)
+        
+        # Post the messages with bounded concurrency
+        semaphore = asyncio.Semaphore(BATCH_POST_CONCURRENCY)
+        now = datetime.utcnow()
+        
+        async def post(line, spec, required_role):
+            giveaway_id = f"{interaction.channel.id}_{int(now.timestamp())}_{line}"
+            end_time = now + spec['duration']
+            embed = build_giveaway_embed(data.config, spec, end_time, required_role, interaction.user)
+            async with semaphore:
+                try:
+                    message = await interaction.channel.send(embed=embed, view=GiveawayButton(giveaway_id))
+                except Exception as e:
+                    results[line] = f"❌ Line {line} ({spec['prize']}): couldn't post the giveaway: {e}"
+                    return None
+            entry_count_updater.remember(giveaway_id, message)
+            results[line] = f"✅ Line {line}: [{spec['prize']}]({message.jump_url}) ends <t:{int(end_time.timestamp())}:R>"
+            return giveaway_id, new_giveaway_record(spec, message, interaction.user, end_time, required_role)
+        
+        posted = await asyncio.gather(*(post(line, spec, required_role) for line, spec, required_role in valid))
+        giveaways = dict(item for item in posted if item)
+        
+        # Persist the whole batch in one write
+        if giveaways:
+            await data.storage.save_giveaway_batch(giveaways)
+            for giveaway_id, giveaway in giveaways.items():
+                scheduler.schedule(interaction.guild.id, giveaway_id, datetime.fromisoformat(giveaway['end_time']))
+        
+        # Per-line report, trimmed to fit one message
+        report = f"**Created {len(giveaways)} of {len(rows)} giveaway(s)**"
+        lines = [results[line] for line in sorted(results)]
+        for n, text in enumerate(lines):
+            if len(report) + len(text) > 1900:
+                report += f"\n…and {len(lines) - n} more"
+                break
+            report += "\n" + text
+        await ack.send(report, ephemeral=True)
 
 @giveaway_group.command(name="end", description="Manually end a giveaway early (Support only)")
 @app_commands.describe(message_id="The message ID of the giveaway to end")
+@instrumented("giveaway end")
 async def giveaway_end(interaction: discord.Interaction, message_id: str):
-    # Check if user has support role
-    support_role = discord.utils.get(interaction.guild.roles, id=SUPPORT_ROLE_ID)
-    if support_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the @support role to use this command!", ephemeral=True)
-        return
-    
-    # Find giveaway
-    giveaways = load_giveaways()
-    giveaway_id = None
-    giveaway = None
-    
-    for gid, g in giveaways.items():
-        if str(g['message_id']) == message_id:
-            giveaway_id = gid
-            giveaway = g
-            break
-    
-    if not giveaway:
-        await interaction.response.send_message("❌ Giveaway not found!", ephemeral=True)
-        return
-    
-    if giveaway.get('ended', False):
-        await interaction.response.send_message("❌ This giveaway has already ended!", ephemeral=True)
-        return
-    
-    await interaction.response.send_message("⏳ Ending giveaway...", ephemeral=True)
-    await end_giveaway(giveaway_id, giveaway)
+    async with AckBudget(interaction) as ack:
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        # Find giveaway
+        data = get_guild_data(interaction.guild.id)
+        giveaway_id, giveaway = await find_giveaway_by_message(data, message_id)
+        
+        if not giveaway:
+            await ack.send("❌ Giveaway not found!", ephemeral=True)
+            return
+        
+        if giveaway.get('ended', False):
+            await ack.send("❌ This giveaway has already ended!", ephemeral=True)
+            return
+        
+        owner = await ending_workers.claim(data, giveaway_id)
+        if owner is None:
+            await ack.send("⏳ This giveaway is already being ended!", ephemeral=True)
+            return
+        
+        await ack.send("⏳ Ending giveaway...", ephemeral=True)
+        await ending_workers.end(data, giveaway_id, giveaway, owner)
 
 @giveaway_group.command(name="reroll", description="Reroll a giveaway winner (Support only)")
 @app_commands.describe(message_id="The message ID of the giveaway to reroll")
+@instrumented("giveaway reroll")
 async def giveaway_reroll(interaction: discord.Interaction, message_id: str):
-    # Check if user has support role
-    support_role = discord.utils.get(interaction.guild.roles, id=SUPPORT_ROLE_ID)
-    if support_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the @support role to use this command!", ephemeral=True)
-        return
-    
-    # Find giveaway
-    giveaways = load_giveaways()
-    giveaway = None
-    
-    for g in giveaways.values():
-        if str(g['message_id']) == message_id:
-            giveaway = g
-            break
-    
-    if not giveaway:
-        await interaction.response.send_message("❌ Giveaway not found!", ephemeral=True)
-        return
-    
-    if not giveaway.get('ended', False):
-        await interaction.response.send_message("❌ This giveaway hasn't ended yet!", ephemeral=True)
-        return
-    
-    if len(giveaway['entries']) == 0:
-        await interaction.response.send_message("❌ No entries to reroll!", ephemeral=True)
-        return
-    
-    # Build weighted entry pool
-    guild = interaction.guild
-    entry_pool = []
-    
-    for user_id in giveaway['entries']:
-        try:
-            member = guild.get_member(int(user_id))
-            if not member:
-                continue
-            
-            user_entries = await get_user_entries(member)
-            for _ in range(user_entries):
-                entry_pool.append(member)
-        except:
-            continue
-    
-    if not entry_pool:
-        await interaction.response.send_message("❌ No valid entries to reroll!", ephemeral=True)
-        return
-    
-    # Pick new winner with weighted chances
-    winner = random.choice(entry_pool)
-    gp_amount = giveaway['gp_amount']
-    gp_display = giveaway.get('gp_display', format_amount(gp_amount) + " GP")
-    
-    # Check if winner has booster role
-    booster_role = guild.get_role(BOOSTER_ROLE_ID)
-    has_booster = booster_role in winner.roles
-    claim_deadline = datetime.utcnow() + timedelta(hours=24)
-    
-    # Only add GP if gp_amount > 0 and winner has booster
-    if has_booster and gp_amount > 0:
-        # Award GP directly
-        current_balance = get_balance(winner.id)
-        new_balance = current_balance + gp_amount
-        set_balance(winner.id, new_balance)
-    
-    # Give Winners Circle role
-    winners_circle_role = guild.get_role(WINNERS_CIRCLE_ROLE_ID)
-    if winners_circle_role and winners_circle_role not in winner.roles:
-        try:
-            await winner.add_roles(winners_circle_role)
-        except:
-            pass
-    
-    # DM winner
-    try:
-        dm_embed = discord.Embed(
-            title="🎉 Congratulations!",
-            color=discord.Color.gold()
-        )
+    async with AckBudget(interaction, ephemeral=False) as ack:
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        # Find giveaway (archived giveaways carry their own entries)
+        data = get_guild_data(interaction.guild.id)
+        giveaway_id, giveaway = await find_giveaway_by_message(data, message_id, include_archive=True)
+        
+        if not giveaway:
+            await ack.send("❌ Giveaway not found!", ephemeral=True)
+            return
+        
+        if not giveaway.get('ended', False):
+            await ack.send("❌ This giveaway hasn't ended yet!", ephemeral=True)
+            return
         
-        if has_booster and gp_amount > 0:
-            dm_embed.description = f"You won the reroll for **{giveaway['prize']}**!\n\n💰 **{gp_display}** has been added to your wallet!\n🏆 You've been given the Winners Circle role!"
-        elif gp_amount > 0:
-            dm_embed.description = f"You won the reroll for **{giveaway['prize']}**!\n\n💰 **Prize:** {gp_display}\n🏆 You've been given the Winners Circle role!\n\n⚠️ **YOU MUST OPEN A TICKET WITHIN 24 HOURS OF THIS MESSAGE TO BE ABLE TO CLAIM. IF YOU DO NOT OPEN A CLAIM TICKET WITHIN THE ALLOTTED TIME YOUR PRIZE WILL BE FORFEITED.**\n\n⏰ Claim by: <t:{int(claim_deadline.timestamp())}:F>"
+        guild = interaction.guild
+        if 'draw' in giveaway:
+            pool = DrawPool.from_json(giveaway['draw'])
         else:
-            # No GP prize
-            dm_embed.description = f"You won the reroll for **{giveaway['prize']}**!\n\n🎁 **Prize:** {gp_display}\n🏆 You've been given the Winners Circle role!\n\n⚠️ **YOU MUST OPEN A TICKET WITHIN 24 HOURS OF THIS MESSAGE TO BE ABLE TO CLAIM. IF YOU DO NOT OPEN A CLAIM TICKET WITHIN THE ALLOTTED TIME YOUR PRIZE WILL BE FORFEITED.**\n\n⏰ Claim by: <t:{int(claim_deadline.timestamp())}:F>"
+            # Ended before draw snapshots were kept - rebuild the pool from the entries once
+            entries = giveaway['entries'] if 'entries' in giveaway else await data.storage.get_entries(giveaway_id)
+            if len(entries) == 0:
+                await ack.send("❌ No entries to reroll!", ephemeral=True)
+                return
+            pool = DrawPool.from_candidates(await build_candidates(guild, entries), giveaway.get('ending', {}).get('winners', ()))
         
-        dm_embed.set_thumbnail(url=THUMBNAIL_URL)
-        await winner.send(embed=dm_embed)
-    except:
-        pass
-    
-    await interaction.response.send_message(f"🎉 **Reroll Winner:** {winner.mention}\n**Prize:** {giveaway['prize']} + {gp_display}")
-    
-    # Log the reroll
-    try:
-        log_channel = bot.get_channel(GIVEAWAY_LOG_CHANNEL_ID)
-        if log_channel:
+        # Pick new winner with weighted chances from the frozen pool, skipping everyone who already won
+        # and anyone drawn who has left the guild since
+        exclude = set(pool.winners)
+        winner = None
+        while winner is None:
+            user_id = pool.sample(exclude)
+            if user_id is None:
+                break
+            exclude.add(user_id)
+            winner = next(iter(await resolve_winners(guild, [user_id])), None)
+        
+        if winner is None:
+            await ack.send("❌ No valid entries to reroll!", ephemeral=True)
+            return
+        
+        # Record the new winner so later rerolls skip them (archived giveaways get an updated record appended)
+        pool.winners = pool.winners + [winner.id]
+        giveaway['draw'] = pool
+        if giveaway.pop('archived', False):
+            await run_in_storage_thread(data.archive.append, {giveaway_id: giveaway})
+        else:
+            await data.storage.save_giveaway(giveaway_id, giveaway)
+        
+        gp_amount = giveaway['gp_amount']
+        gp_display = giveaway.get('gp_display', format_amount(gp_amount) + " GP")
+        
+        # Respond before the payout so retries can't push past the interaction deadline
+        await ack.send(f"🎉 **Reroll Winner:** {winner.mention}\n**Prize:** {giveaway['prize']} + {gp_display}")
+        
+        # Award GP, give Winners Circle role and DM the winner
+        claim_deadline = datetime.utcnow() + timedelta(hours=24)
+        credited = await credit_winners(data, [winner], giveaway_id, giveaway, "giveaway_reroll", actor_id=interaction.user.id)
+        result = (await notify_winners([winner], giveaway, guild, data.config, credited, claim_deadline, reroll=True))[0]
+        
+        # Log the reroll
+        if data.config['log_channel_id']:
             host = guild.get_member(giveaway['host_id'])
             host_mention = host.mention if host else f"<@{giveaway['host_id']}>"
             
@@ -710,8 +2839,7 @@ async def giveaway_reroll(interaction: discord.Interaction, message_id: str):
                 inline=False
             )
             
-            status = "✅ Auto-claimed" if (has_booster and gp_amount > 0) else "⏳ Must claim"
-            winner_info = f"**Winner:** {winner.mention} ({status})\n"
+            winner_info = f"**Winner:** {format_payout_result(result)}\n"
             winner_info += f"**Won at:** <t:{int(datetime.utcnow().timestamp())}:F>\n"
             winner_info += f"**Claim deadline:** <t:{int(claim_deadline.timestamp())}:R>"
             
@@ -721,126 +2849,393 @@ async def giveaway_reroll(interaction: discord.Interaction, message_id: str):
                 inline=False
             )
             
-            log_embed.set_thumbnail(url=THUMBNAIL_URL)
+            log_embed.set_thumbnail(url=data.config['thumbnail_url'])
             
-            await log_channel.send(embed=log_embed)
-    except Exception as e:
-        print(f"Error logging reroll: {e}")
+            await log_digest.post(data, log_embed)
 
 @giveaway_group.command(name="list", description="List all active giveaways")
+@instrumented("giveaway list")
 async def giveaway_list(interaction: discord.Interaction):
-    giveaways = load_giveaways()
-    active = [g for g in giveaways.values() if not g.get('ended', False)]
-    
-    if not active:
-        await interaction.response.send_message("❌ No active giveaways!", ephemeral=True)
-        return
-    
-    embed = discord.Embed(
-        title="🎉 Active Giveaways",
-        color=discord.Color.blue()
-    )
-    
-    for g in active:
-        end_time = datetime.fromisoformat(g['end_time'])
-        gp_display = g.get('gp_display', format_amount(g['gp_amount']) + " GP")
+    async with AckBudget(interaction, ephemeral=False) as ack:
+        storage = get_guild_data(interaction.guild.id).storage
+        active = list((await storage.active_giveaways()).items())
+        
+        if not active:
+            await ack.send("❌ No active giveaways!", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="🎉 Active Giveaways",
+            color=discord.Color.blue()
+        )
+        
+        for giveaway_id, g in active:
+            end_time = datetime.fromisoformat(g['end_time'])
+            gp_display = g.get('gp_display', format_amount(g['gp_amount']) + " GP")
+            embed.add_field(
+                name=g['prize'],
+                value=f"Reward: {gp_display}\nEntries: {await storage.count_entries(giveaway_id)}\nEnds: <t:{int(end_time.timestamp())}:R>\n[Jump to Giveaway](https://discord.com/channels/{interaction.guild.id}/{g['channel_id']}/{g['message_id']})",
+                inline=False
+            )
+        
+        await ack.send(embed=embed)
+
+# Columns of an export - every row has a kind (giveaway, winner, entry or wallet) and the fields that apply to it
+EXPORT_COLUMNS = ('kind', 'giveaway_id', 'user_id', 'prize', 'gp_amount', 'host_id', 'end_time', 'ended', 'entry_count', 'balance')
+
+# Stream a guild's export rows - each giveaway (live, then archived) followed by its winners and entries, then wallet
+# balances. Reads the backend directly, so advance it on the storage thread (or offline)
+def export_rows(backend, archive, balances):
+    def giveaway_rows(giveaway_id, giveaway, entries):
+        yield {
+            'kind': 'giveaway',
+            'giveaway_id': giveaway_id,
+            'prize': giveaway['prize'],
+            'gp_amount': giveaway['gp_amount'],
+            'host_id': giveaway['host_id'],
+            'end_time': giveaway['end_time'],
+            'ended': bool(giveaway.get('ended', False)),
+            'entry_count': len(entries)
+        }
+        draw = giveaway.get('draw')
+        if draw is not None:
+            winners = draw.winners if isinstance(draw, DrawPool) else draw['winners']
+        else:
+            winners = giveaway.get('ending', {}).get('winners', [])
+        for user_id in winners:
+            yield {'kind': 'winner', 'giveaway_id': giveaway_id, 'user_id': user_id}
+        for user_id in entries:
+            yield {'kind': 'entry', 'giveaway_id': giveaway_id, 'user_id': user_id}
+    
+    # One record at a time - ended giveaways carry their whole draw snapshot
+    exported = set()
+    for giveaway_id in backend.giveaway_ids():
+        giveaway = backend.get_giveaway(giveaway_id)
+        if giveaway is None:
+            # Archived since the IDs were read - it's exported from the archive below
+            continue
+        exported.add(giveaway_id)
+        yield from giveaway_rows(giveaway_id, giveaway, backend.get_entries(giveaway_id))
+    # Rerolls append updated copies of archived giveaways, so only each one's newest record is exported
+    newest = {}
+    for position, (giveaway_id, giveaway) in enumerate(archive.records()):
+        newest[giveaway_id] = position
+    for position, (giveaway_id, giveaway) in enumerate(archive.records()):
+        # A crash between archiving and removal leaves a giveaway in both
+        if newest[giveaway_id] == position and giveaway_id not in exported:
+            yield from giveaway_rows(giveaway_id, giveaway, EntrySet.from_json(giveaway.get('entries', [])))
+    for user_id, balance in sorted(balances.items()):
+        yield {'kind': 'wallet', 'user_id': user_id, 'balance': balance}
+
+# Gzip-compressed NDJSON or CSV export, split into standalone parts of at most chunk_bytes so each fits in one upload
+class ExportWriter:
+    def __init__(self, directory, prefix, file_format, chunk_bytes):
+        self.directory = directory
+        self.prefix = prefix
+        self.file_format = file_format
+        self.chunk_bytes = chunk_bytes
+        self.paths = []
+        self.raw = None
+        self.slice_growth = 0  # most compressed bytes one slice has added, the headroom kept in each part
+
+    def _open(self):
+        path = os.path.join(self.directory, f"{self.prefix}-part{len(self.paths) + 1:03d}.{self.file_format}.gz")
+        self.paths.append(path)
+        self.raw = open(path, 'wb')
+        self.gz = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        self.text = io.TextIOWrapper(self.gz, encoding='utf-8', newline='')
+        self.csv = None
+        if self.file_format == 'csv':
+            self.csv = csv.DictWriter(self.text, fieldnames=EXPORT_COLUMNS)
+            self.csv.writeheader()
+
+    def _close_part(self):
+        self.text.close()
+        self.raw.close()
+        count_io('write', os.path.getsize(self.paths[-1]))
+        self.raw = None
+
+    def write_slice(self, rows, limit):
+        """Write up to limit rows from the iterator, returns False once it's exhausted"""
+        written = 0
+        before = self.raw.tell() if self.raw else 0
+        for row in itertools.islice(rows, limit):
+            if self.raw is None:
+                self._open()
+            if self.csv:
+                self.csv.writerow(row)
+            else:
+                self.text.write(json.dumps(row) + "\n")
+            written += 1
+        
+        if self.raw is not None:
+            # Push the compressor's output to the file so the part's real size is known
+            self.text.flush()
+            self.gz.flush()
+            size = self.raw.tell()
+            self.slice_growth = max(self.slice_growth, size - before)
+            if size + self.slice_growth > self.chunk_bytes:
+                self._close_part()
+        return written == limit
+
+    def close(self):
+        """Finish the last part, returns the paths of every part"""
+        if not self.paths:
+            # Nothing to export - still hand back a (headers only) file
+            self._open()
+        if self.raw is not None:
+            self._close_part()
+        return self.paths
+
+@giveaway_group.command(name="export", description="Export giveaways, entries, winners and wallet balances (Support only)")
+@app_commands.describe(file_format="NDJSON (one JSON object per line) or CSV, both gzip-compressed")
+@app_commands.rename(file_format="format")
+@app_commands.choices(file_format=[
+    app_commands.Choice(name="NDJSON", value="ndjson"),
+    app_commands.Choice(name="CSV", value="csv")
+])
+@instrumented("giveaway export")
+async def giveaway_export(interaction: discord.Interaction, file_format: str = "ndjson"):
+    async with AckBudget(interaction) as ack:
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        data = get_guild_data(interaction.guild.id)
+        balances = dict(await data.wallets.load())
+        directory = tempfile.mkdtemp(prefix="giveaway-export-")
+        try:
+            chunk_bytes = min(EXPORT_CHUNK_BYTES, interaction.guild.filesize_limit)
+            writer = ExportWriter(directory, f"giveaway-export-{interaction.guild.id}", file_format, chunk_bytes)
+            rows = export_rows(data.backend, data.archive, balances)
+            
+            # A slice at a time, so entering and ending giveaways isn't held up behind a long export
+            while await run_in_storage_thread(writer.write_slice, rows, EXPORT_SLICE_ROWS):
+                pass
+            paths = await run_in_storage_thread(writer.close)
+            
+            for n, path in enumerate(paths, 1):
+                await ack.send(f"📦 Export part {n}/{len(paths)}", file=discord.File(path), ephemeral=True)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+@giveaway_group.command(name="config", description="Show or change this server's giveaway settings (Manage Server only)")
+@app_commands.describe(
+    support_role="Role allowed to run giveaways and manage wallets",
+    booster_role="Role whose winners get GP credited to their wallet automatically",
+    winners_circle_role="Role given to winners",
+    log_channel="Channel for winner and reroll logs",
+    bonus_roles="Extra entries per role, e.g. '@Booster:2, @Winners:3' ('none' to clear)",
+    thumbnail_url="Thumbnail image URL for giveaway embeds",
+    banner_url="Banner image URL for giveaway embeds"
+)
+@instrumented("giveaway config")
+async def giveaway_config(
+    interaction: discord.Interaction,
+    support_role: discord.Role = None,
+    booster_role: discord.Role = None,
+    winners_circle_role: discord.Role = None,
+    log_channel: discord.TextChannel = None,
+    bonus_roles: str = None,
+    thumbnail_url: str = None,
+    banner_url: str = None
+):
+    async with AckBudget(interaction) as ack:
+        if not interaction.user.guild_permissions.manage_guild:
+            await ack.send("❌ You need the Manage Server permission to use this command!", ephemeral=True)
+            return
+        
+        changes = {}
+        if support_role:
+            changes['support_role_id'] = support_role.id
+        if booster_role:
+            changes['booster_role_id'] = booster_role.id
+        if winners_circle_role:
+            changes['winners_circle_role_id'] = winners_circle_role.id
+        if log_channel:
+            changes['log_channel_id'] = log_channel.id
+        if thumbnail_url:
+            changes['thumbnail_url'] = thumbnail_url
+        if banner_url:
+            changes['banner_url'] = banner_url
+        if bonus_roles:
+            pairs = re.findall(r'(\d{15,20})>?\s*:\s*(\d+)', bonus_roles)
+            if not pairs and bonus_roles.strip().lower() != "none":
+                await ack.send("❌ Invalid bonus roles! Use a format like: @Booster:2, @Winners:3", ephemeral=True)
+                return
+            changes['role_bonuses'] = {int(role_id): int(bonus) for role_id, bonus in pairs}
+        
+        data = get_guild_data(interaction.guild.id)
+        if changes:
+            await data.update_config(changes)
+        config = data.config
+        
+        def role(role_id):
+            return f"<@&{role_id}>" if role_id else "Not set"
+        
+        embed = discord.Embed(
+            title="⚙️ Giveaway Settings" + (" (updated)" if changes else ""),
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Support role", value=role(config['support_role_id']), inline=True)
+        embed.add_field(name="Booster role", value=role(config['booster_role_id']), inline=True)
+        embed.add_field(name="Winners Circle role", value=role(config['winners_circle_role_id']), inline=True)
+        embed.add_field(name="Log channel", value=f"<#{config['log_channel_id']}>" if config['log_channel_id'] else "Not set", inline=True)
         embed.add_field(
-            name=g['prize'],
-            value=f"Reward: {gp_display}\nEntries: {len(g['entries'])}\nEnds: <t:{int(end_time.timestamp())}:R>\n[Jump to Giveaway](https://discord.com/channels/{interaction.guild.id}/{g['channel_id']}/{g['message_id']})",
-            inline=False
+            name="Extra entries",
+            value="\n".join(f"<@&{role_id}>: +{bonus}" for role_id, bonus in config['role_bonuses'].items()) or "None",
+            inline=True
         )
-    
-    await interaction.response.send_message(embed=embed)
+        embed.set_thumbnail(url=config['thumbnail_url'])
+        embed.set_image(url=config['banner_url'])
+        await ack.send(embed=embed, ephemeral=True)
 
 bot.tree.add_command(giveaway_group)
 
 # /wallet command - check balance
 @bot.tree.command(name="wallet", description="Check your GP balance")
+@app_commands.guild_only()
+@instrumented("wallet")
 async def wallet(interaction: discord.Interaction):
-    user_id = interaction.user.id
-    balance = get_balance(user_id)
-    formatted_balance = format_amount(balance)
-    
-    embed = discord.Embed(
-        title="💰 Wallet",
-        description=f"**{interaction.user.display_name}** has **{formatted_balance} GP**",
-        color=discord.Color.gold()
-    )
-    embed.set_thumbnail(url=THUMBNAIL_URL)
-    await interaction.response.send_message(embed=embed)
+    async with AckBudget(interaction, ephemeral=False) as ack:
+        user_id = interaction.user.id
+        balance = await get_balance(interaction.guild.id, user_id)
+        formatted_balance = format_amount(balance)
+        
+        embed = discord.Embed(
+            title="💰 Wallet",
+            description=f"**{interaction.user.display_name}** has **{formatted_balance} GP**",
+            color=discord.Color.gold()
+        )
+        embed.set_thumbnail(url=get_guild_data(interaction.guild.id).config['thumbnail_url'])
+        await ack.send(embed=embed)
 
 # /wallet-add command - add GP (support only)
 @bot.tree.command(name="wallet-add", description="Add GP to a user's wallet (Support only)")
+@app_commands.guild_only()
 @app_commands.describe(user="The user to add GP to", amount="Amount to add (e.g., 20m, 500k, 1000)")
+@instrumented("wallet-add")
 async def wallet_add(interaction: discord.Interaction, user: discord.Member, amount: str):
-    # Check if user has support role
-    support_role = discord.utils.get(interaction.guild.roles, id=SUPPORT_ROLE_ID)
-    if support_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the @support role to use this command!", ephemeral=True)
-        return
-    
-    # Parse amount
-    parsed_amount = parse_amount(amount)
-    if parsed_amount is None or parsed_amount <= 0:
-        await interaction.response.send_message("❌ Invalid amount! Use formats like: 20m, 500k, 1000", ephemeral=True)
-        return
-    
-    # Add to wallet
-    current_balance = get_balance(user.id)
-    new_balance = current_balance + parsed_amount
-    set_balance(user.id, new_balance)
-    
-    formatted_amount = format_amount(parsed_amount)
-    formatted_new_balance = format_amount(new_balance)
-    
-    embed = discord.Embed(
-        title="✅ GP Added",
-        description=f"Added **{formatted_amount} GP** to {user.mention}'s wallet\nNew balance: **{formatted_new_balance} GP**",
-        color=discord.Color.green()
-    )
-    await interaction.response.send_message(embed=embed)
+    async with AckBudget(interaction, ephemeral=False) as ack:
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        # Parse amount
+        parsed_amount = parse_amount(amount)
+        if parsed_amount is None or parsed_amount <= 0:
+            await ack.send("❌ Invalid amount! Use formats like: 20m, 500k, 1000", ephemeral=True)
+            return
+        
+        # Add to wallet
+        new_balance = (await get_guild_data(interaction.guild.id).wallets.commit([
+            wallet_transaction(user.id, parsed_amount, "wallet_add", actor_id=interaction.user.id)
+        ]))[user.id]
+        
+        formatted_amount = format_amount(parsed_amount)
+        formatted_new_balance = format_amount(new_balance)
+        
+        embed = discord.Embed(
+            title="✅ GP Added",
+            description=f"Added **{formatted_amount} GP** to {user.mention}'s wallet\nNew balance: **{formatted_new_balance} GP**",
+            color=discord.Color.green()
+        )
+        await ack.send(embed=embed)
 
 # /wallet-remove command - remove GP (support only)
 @bot.tree.command(name="wallet-remove", description="Remove GP from a user's wallet (Support only)")
+@app_commands.guild_only()
 @app_commands.describe(user="The user to remove GP from", amount="Amount to remove (e.g., 20m, 500k, 1000)")
+@instrumented("wallet-remove")
 async def wallet_remove(interaction: discord.Interaction, user: discord.Member, amount: str):
-    # Check if user has support role
-    support_role = discord.utils.get(interaction.guild.roles, id=SUPPORT_ROLE_ID)
-    if support_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the @support role to use this command!", ephemeral=True)
-        return
-    
-    # Parse amount
-    parsed_amount = parse_amount(amount)
-    if parsed_amount is None or parsed_amount <= 0:
-        await interaction.response.send_message("❌ Invalid amount! Use formats like: 20m, 500k, 1000", ephemeral=True)
-        return
-    
-    # Check if sufficient balance
-    current_balance = get_balance(user.id)
-    if current_balance < parsed_amount:
-        await interaction.response.send_message(f"❌ Insufficient balance! {user.mention} only has **{format_amount(current_balance)} GP**", ephemeral=True)
-        return
-    
-    # Remove from wallet
-    new_balance = current_balance - parsed_amount
-    set_balance(user.id, new_balance)
-    
-    formatted_amount = format_amount(parsed_amount)
-    formatted_new_balance = format_amount(new_balance)
-    
-    embed = discord.Embed(
-        title="✅ GP Removed",
-        description=f"Removed **{formatted_amount} GP** from {user.mention}'s wallet\nNew balance: **{formatted_new_balance} GP**",
-        color=discord.Color.red()
-    )
-    await interaction.response.send_message(embed=embed)
+    async with AckBudget(interaction, ephemeral=False) as ack:
+        # Check if user has support role
+        if not has_support_role(interaction.user):
+            await ack.send("❌ You need the @support role to use this command!", ephemeral=True)
+            return
+        
+        # Parse amount
+        parsed_amount = parse_amount(amount)
+        if parsed_amount is None or parsed_amount <= 0:
+            await ack.send("❌ Invalid amount! Use formats like: 20m, 500k, 1000", ephemeral=True)
+            return
+        
+        # Check if sufficient balance
+        current_balance = await get_balance(interaction.guild.id, user.id)
+        if current_balance < parsed_amount:
+            await ack.send(f"❌ Insufficient balance! {user.mention} only has **{format_amount(current_balance)} GP**", ephemeral=True)
+            return
+        
+        # Remove from wallet - commit re-checks under the ledger lock, a concurrent removal may have got there first
+        try:
+            new_balance = (await get_guild_data(interaction.guild.id).wallets.commit([
+                wallet_transaction(user.id, -parsed_amount, "wallet_remove", actor_id=interaction.user.id)
+            ]))[user.id]
+        except ValueError:
+            current_balance = await get_balance(interaction.guild.id, user.id)
+            await ack.send(f"❌ Insufficient balance! {user.mention} only has **{format_amount(current_balance)} GP**", ephemeral=True)
+            return
+        
+        formatted_amount = format_amount(parsed_amount)
+        formatted_new_balance = format_amount(new_balance)
+        
+        embed = discord.Embed(
+            title="✅ GP Removed",
+            description=f"Removed **{formatted_amount} GP** from {user.mention}'s wallet\nNew balance: **{formatted_new_balance} GP**",
+            color=discord.Color.red()
+        )
+        await ack.send(embed=embed)
+
+# Offline export of one guild's partition: python bot.py export [--guild ID] [--format csv] [--output DIR]
+def export_main(argv):
+    parser = argparse.ArgumentParser(prog="bot.py export", description="Export giveaways, entries, winners and wallet balances")
+    parser.add_argument("--guild", type=int, default=PRIMARY_GUILD_ID, help="guild ID (default: PRIMARY_GUILD_ID)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--output", default=".", help="directory for the .gz parts")
+    parser.add_argument("--chunk-mb", type=float, default=EXPORT_CHUNK_BYTES / 2**20, help="largest part size")
+    args = parser.parse_args(argv)
+    
+    data_dir = partition_dir(args.guild)
+    if data_dir and not os.path.isdir(data_dir):
+        parser.error(f"no data for guild {args.guild} in {DATA_DIR}")
+    
+    # Read-only - an export never creates, migrates or repairs the data it reads
+    try:
+        backend = open_storage(data_dir, read_only=True)
+    except sqlite3.Error as e:
+        parser.error(f"can't open the database for guild {args.guild}: {e}")
+    archive = GiveawayArchive(backend.data_file(ARCHIVE_FILE))
+    balances, transactions, _ = backend.load_wallet_state()
+    fold_transactions(balances, transactions)
+    
+    os.makedirs(args.output, exist_ok=True)
+    writer = ExportWriter(args.output, f"giveaway-export-{args.guild}", args.format, int(args.chunk_mb * 2**20))
+    rows = export_rows(backend, archive, balances)
+    while writer.write_slice(rows, EXPORT_SLICE_ROWS):
+        pass
+    for path in writer.close():
+        print(path)
+    backend.close()
 
 # Run the bot
 if __name__ == "__main__":
     TOKEN = os.getenv("DISCORD_BOT_TOKEN")
-    if not TOKEN:
+    if sys.argv[1:2] == ["export"]:
+        export_main(sys.argv[2:])
+    elif not TOKEN:
         print("Error: DISCORD_BOT_TOKEN not found in environment variables!")
         print("Please create a .env file or set the environment variable.")
+    elif not PRIMARY_GUILD_ID and legacy_data_files():
+        # Starting anyway would quietly leave the existing giveaways, wallets and settings unused
+        print(f"Error: found single-server data ({', '.join(legacy_data_files())}) but PRIMARY_GUILD_ID is not set!")
+        print("Set PRIMARY_GUILD_ID to the ID of the server this data belongs to.")
     else:
-        bot.run(TOKEN)
+        try:
+            bot.run(TOKEN)
+        finally:
+            # Let queued storage writes finish before the final snapshots and flushes
+            storage_executor.shutdown(wait=True)
+            for data in guild_data.values():
+                data.close()